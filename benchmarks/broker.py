@@ -0,0 +1,70 @@
+from collections import defaultdict, deque
+from typing import Iterable, Optional
+
+
+class InMemoryBroker:
+    # Stands in for RabbitMQ: queues are plain deques shared by every
+    # producer created from the same broker.
+    def __init__(self):
+        self.queues: dict[str, deque] = defaultdict(deque)
+
+    def producer(self) -> "InMemoryProducer":
+        return InMemoryProducer(self)
+
+    def drain(self, queue: str) -> list[str]:
+        messages = list(self.queues[queue])
+        self.queues[queue].clear()
+        return messages
+
+
+class InMemoryProducer:
+    def __init__(self, broker: InMemoryBroker):
+        self.broker = broker
+
+    def declare_queue(self, queue: str):
+        self.broker.queues[queue]
+
+    def push_message(self, queue: str, message: str):
+        self.push_messages(queue, [message])
+
+    def push_messages(
+        self,
+        queue: str,
+        messages: Iterable[str],
+        priorities: Optional[Iterable[int]] = None,
+    ) -> int:
+        messages = list(messages)
+        self.broker.queues[queue].extend(messages)
+        return len(messages)
+
+    def is_open(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+
+class InMemoryConnection:
+    # Linger timers never fire on their own; the benchmark flushes explicitly.
+    def call_later(self, delay: float, callback):
+        return callback
+
+    def remove_timeout(self, timer):
+        pass
+
+
+class InMemoryChannel:
+    def __init__(self):
+        self.connection = InMemoryConnection()
+        self.is_open = True
+        self.acked = 0
+        self._last_tag = 0
+
+    def basic_ack(self, delivery_tag: int, multiple: bool = False):
+        self.acked += delivery_tag - self._last_tag if multiple else 1
+        self._last_tag = max(self._last_tag, delivery_tag)
+
+
+class Delivery:
+    def __init__(self, delivery_tag: int):
+        self.delivery_tag = delivery_tag
@@ -0,0 +1,71 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules that only specific code paths need; importing the app must not
+# pull them in.
+DEFERRED_MODULES = ("ffmpeg", "pika", "aio_pika", "httpx", "numpy")
+
+
+def measure(module: str) -> list[tuple[str, int, int]]:
+    # A fresh interpreter per run, so nothing is already in sys.modules.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, LOG_LEVEL="ERROR"),
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Importing {module} failed")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    return imports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measures how long importing the API takes and fails when "
+        "it exceeds the budget or loads a deferred dependency."
+    )
+    parser.add_argument("--module", default="encoder.main")
+    parser.add_argument("--budget", type=float, default=1.5, help="Seconds")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    totals = sorted(
+        next(cumulative for name, _, cumulative in run if name == args.module)
+        for run in runs
+    )
+    median = totals[len(totals) // 2] / 1_000_000
+
+    print(f"import {args.module}: median {median:.3f}s over {args.repeat} runs")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    slowest = sorted(runs[-1], key=lambda item: item[2], reverse=True)
+    for name, self_us, cumulative_us in slowest[: args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    imported = {name for name, _, _ in runs[-1]}
+    loaded = [module for module in DEFERRED_MODULES if module in imported]
+
+    failures = []
+    if loaded:
+        failures.append(f"deferred modules imported eagerly: {', '.join(loaded)}")
+    if median > args.budget:
+        failures.append(f"median {median:.3f}s is over the {args.budget:.3f}s budget")
+
+    if failures:
+        raise SystemExit("FAIL: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
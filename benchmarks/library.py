@@ -0,0 +1,74 @@
+import json
+import os
+import random
+import uuid
+from typing import Iterator
+
+VIDEO_CODECS = ("h264", "h264", "h264", "hevc", "mpeg4", "vc1", "av1")
+AUDIO_CODECS = ("aac", "ac3", "eac3", "dts", "opus")
+SUBTITLE_CODECS = ("subrip", "ass", "hdmv_pgs_subtitle")
+LANGUAGES = ("eng", "fre", "ger", "spa", "jpn")
+DIMENSIONS = ("720x480", "1280x720", "1920x1080", "1920x800", "3840x2160")
+EXTENSIONS = (".mkv", ".mkv", ".mp4", ".avi")
+FILES_PER_DIRECTORY = 40
+DIRECTORIES_PER_LEVEL = 25
+
+
+def default_root() -> str:
+    # tmpfs keeps the tree off the disk, so the walker is measured rather
+    # than the storage.
+    return "/dev/shm" if os.path.isdir("/dev/shm") else "/tmp"
+
+
+def library_paths(root: str, files: int) -> Iterator[str]:
+    for index in range(files):
+        directory = index // FILES_PER_DIRECTORY
+        yield os.path.join(
+            root,
+            f"shelf-{directory // DIRECTORIES_PER_LEVEL:04d}",
+            f"title-{directory:06d}",
+            f"episode-{index:07d}{EXTENSIONS[index % len(EXTENSIONS)]}",
+        )
+
+
+def generate_library(root: str, files: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    paths = []
+    for path in library_paths(root, files):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            # A unique header keeps sampled fingerprints distinct; the rest
+            # of the file is a hole and costs no memory on tmpfs.
+            f.write(path.encode())
+            f.truncate(rng.randint(200, 8000) * 1024 * 1024)
+        paths.append(path)
+
+    return paths
+
+
+def probe_payload(path: str, rng: random.Random) -> str:
+    def tracks(codecs, count):
+        return [
+            {"codec": rng.choice(codecs), "language": rng.choice(LANGUAGES)}
+            for _ in range(count)
+        ]
+
+    return json.dumps(
+        {
+            "uuid": str(uuid.UUID(int=rng.getrandbits(128))),
+            "file_path": path,
+            "file_name": os.path.basename(path),
+            "dimensions": rng.choice(DIMENSIONS),
+            "file_size": os.path.getsize(path),
+            "video_codec": tracks(VIDEO_CODECS, 1),
+            "audio_codec": tracks(AUDIO_CODECS, rng.randint(1, 3)),
+            "subtitle_codec": tracks(SUBTITLE_CODECS, rng.randint(0, 4)),
+            "duration": rng.uniform(600, 9000),
+        }
+    )
+
+
+def probe_payloads(paths: list[str], seed: int = 0) -> Iterator[str]:
+    rng = random.Random(seed)
+    for path in paths:
+        yield probe_payload(path, rng)
@@ -0,0 +1,295 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.broker import Delivery, InMemoryBroker, InMemoryChannel
+from benchmarks.library import default_root, generate_library, probe_payloads
+from benchmarks.timing import Recorder, format_results
+
+QUEUES = {
+    "RABBITMQ_PROBE_QUEUE": "bench-probe",
+    "RABBITMQ_PROBE_RESULT_QUEUE": "bench-probe-result",
+    "RABBITMQ_ENCODE_QUEUE": "bench-encode",
+    "RABBITMQ_ENCODE_RESULTS_QUEUE": "bench-encode-results",
+    "RABBITMQ_ENCODE_PROGRESS_QUEUE": "bench-encode-progress",
+}
+
+
+def configure_environment(workdir: str):
+    # encoder.config reads the environment at import time, so this has to run
+    # before anything from encoder is imported.
+    os.environ.update(QUEUES)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/benchmark.sqlite"
+    os.environ["MEDIA_EXTENSIONS"] = ".mkv,.mp4,.avi"
+    os.environ["EXCLUDE_FOLDERS"] = "@eaDir"
+    os.environ["TEMP_FOLDER"] = "encoder"
+    os.environ["LOG_LEVEL"] = "ERROR"
+
+
+def seed_settings(session_factory, library_root: str, temp_root: str):
+    from encoder.setting import repository, schemas
+
+    with session_factory() as db:
+        for key, value in (
+            (schemas.SettingKeyEnum.scan_path, library_root),
+            (schemas.SettingKeyEnum.temp_path, temp_root),
+        ):
+            repository.create_setting(db, schemas.SettingsCreate(key=key, value=value))
+
+
+def bench_scanner(session_factory, repeat: int) -> Recorder:
+    from encoder.config import SCAN_CHUNK_SIZE
+    from encoder.media.file_system import DirectoryScanner
+
+    recorder = Recorder("DirectoryScanner.walk", "files")
+    for _ in range(repeat):
+        with session_factory() as db:
+            scanner = DirectoryScanner(db)
+            started_at = time.perf_counter()
+            count = 0
+            # Latency is the time to produce each chunk the enqueuer consumes.
+            for count, _ in enumerate(scanner.iter_media_files(), start=1):
+                if count % SCAN_CHUNK_SIZE == 0:
+                    recorder.record(time.perf_counter() - started_at, SCAN_CHUNK_SIZE)
+                    started_at = time.perf_counter()
+            if count % SCAN_CHUNK_SIZE:
+                recorder.record(
+                    time.perf_counter() - started_at, count % SCAN_CHUNK_SIZE
+                )
+
+    return recorder
+
+
+def bench_media_enqueuer(session_factory, name: str) -> Recorder:
+    from encoder.media.enqueuer import MediaEnqueuer
+
+    recorder = Recorder(name, "files")
+
+    class TimedMediaEnqueuer(MediaEnqueuer):
+        def process_chunk(self, chunk, *args, **kwargs):
+            with recorder.measure(len(chunk)):
+                return super().process_chunk(chunk, *args, **kwargs)
+
+    with session_factory() as db:
+        TimedMediaEnqueuer(db).process_all_media_files()
+
+    return recorder
+
+
+def bench_probe_consumer(session_factory, payloads: list[str]) -> Recorder:
+    from encoder.media.consumer import MediaDataQueueConsumer
+
+    recorder = Recorder("MediaDataQueueConsumer.flush", "messages")
+
+    class TimedConsumer(MediaDataQueueConsumer):
+        def flush(self):
+            with recorder.measure(len(self._pending)):
+                super().flush()
+
+    consumer = TimedConsumer(session_factory)
+    channel = InMemoryChannel()
+    for delivery_tag, body in enumerate(payloads, start=1):
+        consumer.on_message_receive(channel, Delivery(delivery_tag), None, body)
+    consumer.flush()
+
+    return recorder
+
+
+def bench_encode_enqueuer(session_factory, limit: int, batch_size: int) -> Recorder:
+    from encoder.encode.enqueuer import EncodeEnqueuer
+    from encoder.media import file_system
+    from encoder.media.entity import Media
+    from encoder.preset.presets import PresetsCollection
+
+    recorder = Recorder("EncodeEnqueuer.enqueue", "media")
+    preset = PresetsCollection().all()[0]
+
+    with session_factory() as db:
+        media = db.query(Media).order_by(Media.id).limit(limit).all()
+        enqueuer = EncodeEnqueuer(db, file_system.FileManager(db))
+        for start in range(0, len(media), batch_size):
+            batch = media[start : start + batch_size]
+            with recorder.measure(len(batch)):
+                enqueuer.enqueue_for_processing(batch, preset)
+
+    return recorder
+
+
+def bench_listing(requests: int) -> list[Recorder]:
+    from fastapi.testclient import TestClient
+
+    from encoder.main import api
+
+    # Not entered as a context manager, so startup never connects consumers.
+    client = TestClient(api)
+
+    def timed_get(recorder: Recorder, url: str, params: dict) -> dict:
+        with recorder.measure():
+            response = client.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    first_page = Recorder("GET /api/media page 1", "requests")
+    for _ in range(requests):
+        timed_get(first_page, "/api/media", {"page": 1, "count": "exact"})
+
+    total = client.get("/api/media", params={"count": "exact"}).json()["totalItems"]
+    deep_page = Recorder("GET /api/media deep offset", "requests")
+    last_page = max(1, int(total * 0.9) // 50)
+    for page in range(last_page, last_page + requests):
+        timed_get(deep_page, "/api/media", {"page": page, "count": "cached"})
+
+    cursor_walk = Recorder("GET /api/media cursor walk", "requests")
+    params = {"count": "none"}
+    for _ in range(requests):
+        body = timed_get(cursor_walk, "/api/media", params)
+        if not body["nextCursor"]:
+            break
+        params = {"count": "none", "after": body["nextCursor"]}
+
+    codec_filter = Recorder("GET /api/media codec filter", "requests")
+    for _ in range(requests):
+        timed_get(
+            codec_filter,
+            "/api/media",
+            {
+                "field": "video_codec",
+                "operator": "contains",
+                "value": "hevc",
+                "count": "cached",
+            },
+        )
+
+    facets = Recorder("GET /api/media/codecs", "requests")
+    for _ in range(requests):
+        timed_get(facets, "/api/media/codecs", {})
+
+    return [first_page, deep_page, cursor_walk, codec_filter, facets]
+
+
+def compare_to_baseline(
+    results: list[dict], baseline: dict, files: int, max_regression: float
+) -> list[str]:
+    if baseline.get("files") != files:
+        return [
+            f"baseline was recorded with --files {baseline.get('files')}, "
+            f"this run used {files}"
+        ]
+
+    expected = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        reference = expected.get(result["name"])
+        if not reference or not reference["throughput"]:
+            continue
+
+        change = result["throughput"] / reference["throughput"] - 1
+        if change < -max_regression:
+            regressions.append(
+                f"{result['name']}: {result['throughput']:.1f} {result['unit']}/s "
+                f"is {-change:.0%} below the baseline "
+                f"{reference['throughput']:.1f} {result['unit']}/s"
+            )
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmarks scan, probe ingestion, encode submission and "
+        "listing against a synthetic library and an in-memory broker."
+    )
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--root", default=default_root())
+    parser.add_argument("--scan-repeat", type=int, default=3)
+    parser.add_argument("--encode-limit", type=int, default=5_000)
+    parser.add_argument("--encode-batch", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the library")
+    parser.add_argument(
+        "--baseline", help="Fail when throughput regresses against this file"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.3,
+        help="Allowed throughput drop against the baseline, as a fraction",
+    )
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="encoder-bench-", dir=args.root)
+    library_root = os.path.join(workdir, "library")
+    configure_environment(workdir)
+
+    from encoder import migrations, rabbitmq
+    from encoder.database import SessionLocal
+
+    broker = InMemoryBroker()
+    rabbitmq.producer_pool.use_factory(broker.producer)
+    # Imports every entity module, so all tables are on Base.metadata.
+    migrations.migrate()
+    seed_settings(SessionLocal, library_root, os.path.join(workdir, "temp"))
+    logging.getLogger().setLevel(logging.ERROR)
+
+    try:
+        started_at = time.perf_counter()
+        paths = generate_library(library_root, args.files, args.seed)
+        print(
+            f"Generated {len(paths)} sparse files in "
+            f"{time.perf_counter() - started_at:.1f}s under {library_root}",
+            file=sys.stderr,
+        )
+
+        recorders = [bench_scanner(SessionLocal, args.scan_repeat)]
+        recorders.append(bench_media_enqueuer(SessionLocal, "MediaEnqueuer first scan"))
+        recorders.append(bench_media_enqueuer(SessionLocal, "MediaEnqueuer rescan"))
+        broker.drain(QUEUES["RABBITMQ_PROBE_QUEUE"])
+
+        payloads = list(probe_payloads(paths, args.seed))
+        recorders.append(bench_probe_consumer(SessionLocal, payloads))
+        recorders.append(
+            bench_encode_enqueuer(SessionLocal, args.encode_limit, args.encode_batch)
+        )
+        broker.drain(QUEUES["RABBITMQ_ENCODE_QUEUE"])
+        recorders.extend(bench_listing(args.requests))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = [recorder.result() for recorder in recorders]
+    print(format_results(results))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "created_at": datetime.datetime.utcnow().isoformat(),
+                    "files": args.files,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare_to_baseline(
+            results, baseline, args.files, args.max_regression
+        )
+        if regressions:
+            raise SystemExit("FAIL: " + "; ".join(regressions))
+        print(f"No regressions over {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import math
+import time
+from contextlib import contextmanager
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(quantile * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self, name: str, unit: str = "items"):
+        self.name = name
+        self.unit = unit
+        self.latencies: list[float] = []
+        self.items = 0
+        self.elapsed = 0.0
+
+    @contextmanager
+    def measure(self, items: int = 1):
+        started_at = time.perf_counter()
+        yield
+        self.record(time.perf_counter() - started_at, items)
+
+    def record(self, elapsed: float, items: int = 1):
+        self.latencies.append(elapsed)
+        self.items += items
+        self.elapsed += elapsed
+
+    def result(self) -> dict:
+        return {
+            "name": self.name,
+            "unit": self.unit,
+            "items": self.items,
+            "operations": len(self.latencies),
+            "elapsed": round(self.elapsed, 4),
+            "throughput": round(self.items / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(percentile(self.latencies, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 3),
+        }
+
+
+def format_results(results: list[dict]) -> str:
+    header = (
+        f"{'benchmark':<32} {'items':>9} {'ops':>7} {'throughput':>18} "
+        f"{'p50 ms':>10} {'p99 ms':>10}"
+    )
+    lines = [header, "-" * len(header)]
+    for result in results:
+        throughput = f"{result['throughput']:.1f} {result['unit']}/s"
+        lines.append(
+            f"{result['name']:<32} {result['items']:>9} {result['operations']:>7} "
+            f"{throughput:>18} {result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f}"
+        )
+
+    return "\n".join(lines)
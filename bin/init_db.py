@@ -0,0 +1,6 @@
+from encoder import migrations
+from encoder.logging import configure_logging
+
+if __name__ == "__main__":
+    configure_logging()
+    migrations.run()
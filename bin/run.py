@@ -1,8 +1,53 @@
+import glob
 import os
+import sys
+import tempfile
 
 import uvicorn
 
 port = int(os.environ.get("API_PORT", 8090))
+workers = int(os.environ.get("API_WORKERS", 1))
 
 if __name__ == "__main__":
-    uvicorn.run("encoder.main:api", host="0.0.0.0", port=port, reload=True)
+    if workers > 1:
+        from encoder import migrations
+        from encoder.config import RABBITMQ_PROGRESS_EXCHANGE, RUN_CONSUMERS_IN_API
+        from encoder.logging import configure_logging
+
+        if RUN_CONSUMERS_IN_API:
+            sys.exit(
+                "API_WORKERS > 1 needs RUN_CONSUMERS_IN_API=0 and bin/worker.py "
+                "running the consumers"
+            )
+        if not RABBITMQ_PROGRESS_EXCHANGE:
+            # Every process's SSE hub would compete for the progress queue and
+            # each client would only see some of the updates.
+            sys.exit(
+                "API_WORKERS > 1 needs RABBITMQ_PROGRESS_EXCHANGE so the worker "
+                "relays progress to every API process"
+            )
+
+        # Migrate once here instead of in every worker at the same time; the
+        # workers are spawned fresh and read the override from the environment.
+        configure_logging()
+        migrations.run()
+        os.environ["DB_AUTO_MIGRATE"] = "0"
+
+        # Each process writes its metrics here and /metrics merges them; a
+        # directory left by a previous run would double count.
+        metrics_dir = os.environ.get("METRICS_DIR") or tempfile.mkdtemp(
+            prefix="encoder-metrics-"
+        )
+        os.environ["METRICS_DIR"] = metrics_dir
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+            os.remove(path)
+
+    # Reload only works with a single process.
+    uvicorn.run(
+        "encoder.main:api",
+        host="0.0.0.0",
+        port=port,
+        reload=workers == 1,
+        workers=workers,
+    )
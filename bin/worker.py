@@ -0,0 +1,20 @@
+import signal
+import threading
+
+from encoder import metrics, migrations
+from encoder.config import WORKER_METRICS_PORT
+from encoder.logging import configure_logging
+from encoder.worker import worker
+
+if __name__ == "__main__":
+    configure_logging()
+    # The API or `make init_db` owns migrations; the worker only waits for them.
+    migrations.wait_for_schema()
+    if WORKER_METRICS_PORT:
+        metrics.serve(WORKER_METRICS_PORT)
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+
+    worker.run_forever(stopping)
@@ -1,8 +1,7 @@
 from fastapi import HTTPException, APIRouter
-import requests
-from .config import (
-    RABBITMQ_MANAGEMENT_URL,
-)
+from fastapi.responses import PlainTextResponse
+from encoder.health import health_monitor
+from encoder import metrics as metrics_registry
 
 router = APIRouter()
 
@@ -14,16 +13,16 @@ def healthcheck():
 
 @router.get("/healthcheck/rabbitmq")
 def rabbitmq_healthcheck():
-    try:
-        response = requests.get(RABBITMQ_MANAGEMENT_URL)
-        data = response.json()
+    snapshot = health_monitor.snapshot()
 
-        if response.status_code != 200 or data["status"] != "ok":
-            raise HTTPException(status_code=500, detail="RabbitMQ is not healthy")
+    if not snapshot["rabbitmq"]:
+        raise HTTPException(status_code=500, detail=snapshot["rabbitmq_error"])
+
+    return {"status": "OK"}
 
-        return {"status": "OK"}
 
-    except requests.RequestException as e:
-        raise HTTPException(
-            status_code=500, detail=f"Failed to connect to RabbitMQ: {e}"
-        )
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(
+        metrics_registry.render(), media_type=metrics_registry.CONTENT_TYPE
+    )
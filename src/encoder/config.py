@@ -12,13 +12,66 @@ FAILED_DIR = config("FAILED_DIR", default=None)
 EXCLUDE_FOLDERS = config("EXCLUDE_FOLDERS", default=None, cast=CommaSeparatedStrings)
 MEDIA_EXTENSIONS = config("MEDIA_EXTENSIONS", default=None, cast=CommaSeparatedStrings)
 API_PORT = config("API_PORT", default=None, cast=int)
+DATABASE_URL = config("DATABASE_URL", default="sqlite:///./var/app.sqlite")
+# Run schema setup on API startup; disable when `make init_db` runs as a
+# separate deploy step.
+DB_AUTO_MIGRATE = config("DB_AUTO_MIGRATE", default=True, cast=bool)
+DATABASE_POOL_SIZE = config("DATABASE_POOL_SIZE", default=10, cast=int)
+DATABASE_MAX_OVERFLOW = config("DATABASE_MAX_OVERFLOW", default=10, cast=int)
+DATABASE_BUSY_TIMEOUT = config("DATABASE_BUSY_TIMEOUT", default=30.0, cast=float)
+MEDIA_COUNT_CACHE_TTL = config("MEDIA_COUNT_CACHE_TTL", default=30.0, cast=float)
+MEDIA_COUNT_CACHE_SIZE = config("MEDIA_COUNT_CACHE_SIZE", default=256, cast=int)
+PRESETS_RELOAD_INTERVAL = config("PRESETS_RELOAD_INTERVAL", default=2.0, cast=float)
+SCAN_WORKERS = config("SCAN_WORKERS", default=8, cast=int)
+FINGERPRINT_WORKERS = config("FINGERPRINT_WORKERS", default=4, cast=int)
+SCAN_CHUNK_SIZE = config("SCAN_CHUNK_SIZE", default=500, cast=int)
+SCAN_JOB_SYNC_INTERVAL = config("SCAN_JOB_SYNC_INTERVAL", default=1.0, cast=float)
+SCAN_JOB_STALE_AFTER = config("SCAN_JOB_STALE_AFTER", default=30.0, cast=float)
 RABBITMQ_HOST = config("RABBITMQ_HOST", default=None)
 RABBITMQ_USER = config("RABBITMQ_USER", default=None)
 RABBITMQ_PASS = config("RABBITMQ_PASS", default=None)
+RABBITMQ_RETRY_DELAY = config("RABBITMQ_RETRY_DELAY", default=1.0, cast=float)
+RABBITMQ_MAX_RETRY_DELAY = config("RABBITMQ_MAX_RETRY_DELAY", default=30.0, cast=float)
+RABBITMQ_PRODUCER_POOL_SIZE = config("RABBITMQ_PRODUCER_POOL_SIZE", default=4, cast=int)
 RABBITMQ_MANAGEMENT_URL = f"http://{RABBITMQ_USER}:{RABBITMQ_PASS}@{RABBITMQ_HOST}:15672/api/healthchecks/node"
 
 RABBITMQ_ENCODE_QUEUE = config("RABBITMQ_ENCODE_QUEUE", default=None)
+# 0 publishes encodes without AMQP priorities. Changing it requires deleting
+# the existing encode queue, since RabbitMQ refuses to redeclare a queue with
+# different arguments.
+ENCODE_QUEUE_MAX_PRIORITY = config("ENCODE_QUEUE_MAX_PRIORITY", default=0, cast=int)
 RABBITMQ_ENCODE_RESULTS_QUEUE = config("RABBITMQ_ENCODE_RESULTS_QUEUE", default=None)
 RABBITMQ_PROBE_QUEUE = config("RABBITMQ_PROBE_QUEUE", default=None)
 RABBITMQ_PROBE_RESULT_QUEUE = config("RABBITMQ_PROBE_RESULT_QUEUE", default=None)
 RABBITMQ_ENCODE_PROGRESS_QUEUE = config("RABBITMQ_ENCODE_PROGRESS_QUEUE", default=None)
+# When set, the worker relays progress updates to this fanout exchange and every
+# API process subscribes to it; required once more than one API process runs.
+RABBITMQ_PROGRESS_EXCHANGE = config("RABBITMQ_PROGRESS_EXCHANGE", default=None)
+# Turn off when bin/worker.py runs the consumers, e.g. with API_WORKERS > 1.
+RUN_CONSUMERS_IN_API = config("RUN_CONSUMERS_IN_API", default=True, cast=bool)
+
+PROBE_RESULT_BATCH_SIZE = config("PROBE_RESULT_BATCH_SIZE", default=100, cast=int)
+PROBE_RESULT_BATCH_LINGER = config("PROBE_RESULT_BATCH_LINGER", default=0.5, cast=float)
+
+SSE_CLIENT_BUFFER_SIZE = config("SSE_CLIENT_BUFFER_SIZE", default=100, cast=int)
+SSE_REPLAY_BUFFER_SIZE = config("SSE_REPLAY_BUFFER_SIZE", default=256, cast=int)
+PROGRESS_SSE_INTERVAL = config("PROGRESS_SSE_INTERVAL", default=1.0, cast=float)
+PROGRESS_STATE_TTL = config("PROGRESS_STATE_TTL", default=600.0, cast=float)
+HEALTH_CHECK_INTERVAL = config("HEALTH_CHECK_INTERVAL", default=10.0, cast=float)
+HEALTH_CHECK_TIMEOUT = config("HEALTH_CHECK_TIMEOUT", default=2.0, cast=float)
+HEALTH_CHECK_TTL = config("HEALTH_CHECK_TTL", default=60.0, cast=float)
+FINALIZE_WORKERS = config("FINALIZE_WORKERS", default=2, cast=int)
+ENCODE_RESULTS_PREFETCH = config("ENCODE_RESULTS_PREFETCH", default=4, cast=int)
+SLOW_REQUEST_THRESHOLD = config("SLOW_REQUEST_THRESHOLD", default=1.0, cast=float)
+REQUEST_PROFILING = config("REQUEST_PROFILING", default=False, cast=bool)
+PROFILE_DIR = config("PROFILE_DIR", default="./var/profiles")
+PROFILE_INTERVAL = config("PROFILE_INTERVAL", default=0.005, cast=float)
+# Shared by API processes so /metrics covers all of them; bin/run.py sets it
+# when API_WORKERS > 1.
+METRICS_DIR = config("METRICS_DIR", default=None)
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", default=5.0, cast=float)
+# bin/worker.py serves its own /metrics here; 0 disables it.
+WORKER_METRICS_PORT = config("WORKER_METRICS_PORT", default=8091, cast=int)
+PREDICTION_REFRESH_INTERVAL = config(
+    "PREDICTION_REFRESH_INTERVAL", default=60.0, cast=float
+)
@@ -1,19 +1,47 @@
 import os
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from encoder.config import (
+    DATABASE_BUSY_TIMEOUT,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_SIZE,
+    DATABASE_URL,
+)
+from encoder.metrics import instrument_engine
+
 if not os.path.exists("./var"):
     os.makedirs("./var")
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./var/app.sqlite"
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": DATABASE_BUSY_TIMEOUT},
+    pool_size=DATABASE_POOL_SIZE,
+    max_overflow=DATABASE_MAX_OVERFLOW,
 )
+
+instrument_engine(engine)
+
+
+@event.listens_for(engine, "connect")
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    # WAL lets API reads proceed while a consumer holds the write lock.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(DATABASE_BUSY_TIMEOUT * 1000)}")
+    cursor.close()
+
+
 SessionLocal = sessionmaker(autoflush=False, bind=engine)
 
+# Keeps IN (...) lists below SQLite's bound parameter limit.
+IN_CLAUSE_CHUNK_SIZE = 500
+
 Base = declarative_base()
 
 def get_db():
@@ -22,3 +50,39 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def chunks(items: list, size: int = IN_CLAUSE_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def init_db():
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
+    # create_all skips existing tables, so indexes added to a table after
+    # it was first created have to be created separately.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def add_missing_columns():
+    # Columns added to an existing table after it was created. Only nullable
+    # columns without server defaults can be added this way.
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {table.name} "
+                        f"ADD COLUMN {column.name} {column_type}"
+                    )
+                )
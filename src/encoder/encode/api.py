@@ -1,5 +1,4 @@
-import aio_pika
-from fastapi import Depends, Request, APIRouter
+from fastapi import Depends, Header, HTTPException, APIRouter
 from sqlalchemy.orm import Session
 from sse_starlette.sse import EventSourceResponse
 from encoder.preset import presets
@@ -8,50 +7,125 @@ from encoder.encode import repository
 from encoder.media import repository as media_repository
 from encoder.database import get_db
 from encoder.encode.schemas import (
+    BulkEncodeResponse,
     EncodeCommand,
+    EncodeEstimateCommand,
+    EncodeEstimateResponse,
+    EncodeItemResult,
+    EncodeProgressState,
     EncodeQuery,
+    EncodeStatusEnum,
     EncodeView,
     QueduedEncodeView,
 )
 from encoder.encode.enqueuer import EncodeEnqueuer
-from encoder.permissions.security import has_permission
-from typing import List
+from encoder.encode.scheduler import encode_scheduler
+from encoder.permissions.security import decide_permissions, has_permissions
+from typing import List, Optional
 from encoder.encode.entity import Encode
-
-from encoder.config import (
-    RABBITMQ_ENCODE_PROGRESS_QUEUE,
-    RABBITMQ_HOST,
-    RABBITMQ_USER,
-    RABBITMQ_PASS,
-)
+from encoder.media.entity import Media
+from encoder.encode.progress import progress_store
+from encoder.sse import progress_hub
 
 router = APIRouter()
 
 
-async def get_rabbitmq_channel():
-    connection = await aio_pika.connect_robust(
-        f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASS}@{RABBITMQ_HOST}",
-        client_properties={"connection_name": "frontend"},
-    )
-    channel = await connection.channel()
-    await channel.declare_queue(RABBITMQ_ENCODE_PROGRESS_QUEUE, durable=False)
-    return channel
+@router.post("/api/encodes", tags=["encode"], response_model=BulkEncodeResponse)
+def encode(
+    command: EncodeCommand,
+    db: Session = Depends(get_db),
+) -> BulkEncodeResponse:
+    check_pinned_priority(command)
+    media_list = media_repository.get_by_ids(db, command.media_ids)
+    has_permissions(db, "ENCODE", media_list)
 
+    return build_bulk_response(enqueue(db, command, media_list))
 
-@router.post("/api/encodes", tags=["encode"])
-def encode(
+
+@router.post("/api/encodes/bulk", tags=["encode"], response_model=BulkEncodeResponse)
+def encode_bulk(
     command: EncodeCommand,
     db: Session = Depends(get_db),
-):
+) -> BulkEncodeResponse:
+    # Unlike POST /api/encodes, missing media and denied permissions are
+    # reported per item instead of failing the whole request.
+    check_pinned_priority(command)
     media_list = media_repository.get_by_ids(db, command.media_ids)
-    for media in media_list:
-        has_permission("ENCODE", media)
+    results = {
+        media_id: EncodeItemResult(
+            media_uuid=media_id, status=EncodeStatusEnum.failed, error="Not found"
+        )
+        for media_id in dict.fromkeys(command.media_ids)
+    }
+
+    allowed = []
+    for media, granted in zip(media_list, decide_permissions(db, "ENCODE", media_list)):
+        if granted:
+            allowed.append(media)
+        else:
+            results[media.uuid] = EncodeItemResult(
+                media_uuid=media.uuid,
+                status=EncodeStatusEnum.failed,
+                error="You do not have permission",
+            )
+
+    for result in enqueue(db, command, allowed):
+        results[result.media_uuid] = result
+
+    return build_bulk_response(list(results.values()))
+
+
+def enqueue(
+    db: Session, command: EncodeCommand, media_list: list[Media]
+) -> list[EncodeItemResult]:
+    preset = presets.PresetsCollection().get(command.preset)
+    encoder = EncodeEnqueuer(db, file_system.FileManager(db))
+
+    return encoder.enqueue_for_processing(media_list, preset, command.priority)
+
+
+def check_pinned_priority(command: EncodeCommand):
+    if command.priority is None or encode_scheduler.can_pin(command.priority):
+        return
 
-    collection = presets.PresetsCollection()
-    preset = collection.get(command.preset)
-    fileManager = file_system.FileManager(db)
-    encoder = EncodeEnqueuer(db, fileManager)
-    encoder.enqueue_for_processing(media_list, preset)
+    if encode_scheduler.max_priority == 0:
+        detail = "Priorities are disabled; set ENCODE_QUEUE_MAX_PRIORITY to pin one"
+    else:
+        detail = f"Priority must be between 0 and {encode_scheduler.max_priority}"
+    raise HTTPException(status_code=422, detail=detail)
+
+
+def build_bulk_response(results: list[EncodeItemResult]) -> BulkEncodeResponse:
+    queued = sum(result.status == EncodeStatusEnum.queued for result in results)
+
+    return BulkEncodeResponse(
+        queued=queued, failed=len(results) - queued, results=results
+    )
+
+
+@router.post(
+    "/api/encodes/estimate",
+    tags=["encode"],
+    response_model=EncodeEstimateResponse,
+)
+def estimate_encodes(
+    command: EncodeEstimateCommand,
+    db: Session = Depends(get_db),
+) -> EncodeEstimateResponse:
+    # Deferred so numpy is only loaded once an estimate is requested.
+    from encoder.encode.prediction import prediction_engine
+
+    preset = presets.PresetsCollection().get(command.preset)
+    if command.media_ids is not None:
+        media = media_repository.get_by_ids(db, command.media_ids)
+    else:
+        media = media_repository.iter_selection(
+            db, command.field, command.operator, command.value
+        )
+
+    return prediction_engine.estimate_selection(
+        db, media, preset, command.include_items
+    )
 
 
 @router.get("/api/encodes", tags=["encode"])
@@ -64,6 +138,15 @@ def list_encodes(
     return encodes
 
 
+@router.get(
+    "/api/encodes/progress",
+    tags=["encode"],
+    response_model=List[EncodeProgressState],
+)
+async def list_encode_progress() -> list[EncodeProgressState]:
+    return progress_store.snapshot()
+
+
 @router.get(
     "/api/encodes/queued", tags=["encode"], response_model=List[QueduedEncodeView]
 )
@@ -81,20 +164,14 @@ def delete_encode(
 
 
 @router.get("/sse", tags=["encodes"])
-async def message_stream(request: Request, channel=Depends(get_rabbitmq_channel)):
-    async def event_generator():
-        queue = await channel.get_queue(RABBITMQ_ENCODE_PROGRESS_QUEUE)
-
-        async with queue.iterator() as queue_iter:
-            async for message in queue_iter:
-                if await request.is_disconnected():
-                    break
+async def message_stream(last_event_id: Optional[str] = Header(default=None)):
+    subscription = progress_hub.subscribe(last_event_id)
 
-                yield {
-                    "event": "progress",
-                    "data": message.body.decode(),
-                }
-
-                await message.ack()
+    async def event_generator():
+        try:
+            async for event in subscription:
+                yield event
+        finally:
+            progress_hub.unsubscribe(subscription)
 
     return EventSourceResponse(event_generator())
@@ -1,33 +1,23 @@
 import json
-from sqlalchemy.orm import Session
 
-from encoder.media import file_system
-
-from encoder.encode import schemas, repository
+from encoder.encode import schemas
+from encoder.encode.finalizer import EncodeFinalizer, encode_finalizer
 
 
 class MediaEncodeQueueConsumer:
-    def __init__(self, db: Session, file_manager: file_system.FileManager):
-        self.db = db
-        self.file_manager = file_manager
+    # Runs on the consumer's worker pool, so slow file moves only hold up
+    # their own worker.
+    def __init__(self, finalizer: EncodeFinalizer = encode_finalizer):
+        self.finalizer = finalizer
 
     def on_message_receive(self, channel, method, properties, body):
         print(f"Received message {body}")
         finishEncode = schemas.EncodeComplete(**json.loads(body))
 
-        encode = repository.get_encode_by_uuid(self.db, finishEncode.id)
-        if not encode:
-            print(f"Encoding not found: {finishEncode.id}")
-            channel.basic_ack(delivery_tag=method.delivery_tag)
-
-        encode.status = schemas.EncodeStatusEnum.finished
-        encode.output_size = self.file_manager.get_file_size_mb(encode.temp_path)
-        encode.duration_in_seconds = finishEncode.duration
-
-        if self.file_manager.file_exist(encode.source_path):
-            self.file_manager.move_original_to_temp(encode.source_path)
-            self.file_manager.move_file(encode.temp_path, encode.source_path)
-
-        self.db.commit()
-
+        self.finalizer.finalize(finishEncode)
         channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    @staticmethod
+    def ordering_key(properties, body):
+        # A redelivered result must not be finalized alongside the original.
+        return json.loads(body).get("id")
@@ -1,4 +1,6 @@
-import ffmpeg
+import logging
+from typing import Optional
+
 from sqlalchemy.orm import Session
 
 from encoder.media import file_system
@@ -7,34 +9,115 @@ from encoder import rabbitmq
 from encoder.encode import repository, schemas
 from encoder.config import RABBITMQ_ENCODE_QUEUE
 from encoder.media.entity import Media
-from encoder.encode.entity import Encode
+from encoder.encode.scheduler import (
+    EncodeScheduler,
+    encode_scheduler,
+    source_video_codec,
+)
 from encoder.encode.schemas import QueueEncode
 from encoder.preset.schemas import Preset
 
 
 class EncodeEnqueuer:
-    def __init__(self, db: Session, file_manager: file_system.FileManager):
+    def __init__(
+        self,
+        db: Session,
+        file_manager: file_system.FileManager,
+        scheduler: Optional[EncodeScheduler] = None,
+    ):
         self.db = db
         self.file_manager = file_manager
+        self.scheduler = scheduler or encode_scheduler
 
-    def enqueue_media_for_processing(self, media: Media, preset: Preset) -> Encode:
-        if not self.file_manager.file_exist(media.file_path):
-            raise RuntimeError(f"File {media.file_path} does not exist")
+    def enqueue_media_for_processing(
+        self, media: Media, preset: Preset, priority: Optional[int] = None
+    ) -> schemas.EncodeItemResult:
+        return self.enqueue_for_processing([media], preset, priority)[0]
 
-        command = self._build_ffmpeg_command(media, preset)
-        message = self._prepare_encode_data(media, command)
+    def enqueue_for_processing(
+        self, media_list: list[Media], preset: Preset, priority: Optional[int] = None
+    ) -> list[schemas.EncodeItemResult]:
+        if not media_list:
+            return []
 
-        self._enqueue_message(message)
+        temp_dir = self.file_manager.get_encode_temp_dir()
+        sizes = self.file_manager.get_file_sizes_mb(
+            [media.file_path for media in media_list]
+        )
 
-    def enqueue_for_processing(
-        self, media_list: list[Media], preset: Preset
-    ) -> list[Encode]:
-        for media in media_list:
-            self.enqueue_media_for_processing(media, preset)
+        results = {}
+        pending = []
+        for media, media_priority in self.scheduler.schedule(
+            media_list, preset, priority
+        ):
+            source_size = sizes.get(media.file_path)
+            if source_size is None:
+                results[media.uuid] = self._failed(
+                    media, f"File {media.file_path} does not exist"
+                )
+                continue
+
+            temp_path = self.file_manager.get_encode_temp_path(
+                media.file_path, temp_dir
+            )
+            command = self._build_ffmpeg_command(media, preset, temp_path)
+            data = schemas.InitializeEncode(
+                media_uuid=media.uuid,
+                status=schemas.EncodeStatusEnum.queued,
+                source_path=media.file_path,
+                temp_path=temp_path,
+                source_size=source_size,
+                command=command.get_args(),
+                priority=media_priority,
+                source_codec=source_video_codec(media),
+                source_dimensions=media.dimensions,
+                source_duration=media.duration,
+            )
+            pending.append((media, data))
+
+        messages = repository.initialize_encodes(self.db, [data for _, data in pending])
+        for (media, _), message in zip(pending, messages):
+            message.duration_in_seconds = media.duration
+
+        published, error = self._enqueue_messages(messages)
+        if published < len(messages):
+            logging.error(f"Published {published} of {len(messages)} encodes: {error}")
+            repository.mark_failed(
+                self.db, [message.id for message in messages[published:]]
+            )
+
+        for index, ((media, _), message) in enumerate(zip(pending, messages)):
+            if index < published:
+                results[media.uuid] = schemas.EncodeItemResult(
+                    media_uuid=media.uuid,
+                    status=schemas.EncodeStatusEnum.queued,
+                    encode_id=message.id,
+                )
+            else:
+                results[media.uuid] = self._failed(
+                    media, f"Publishing failed: {error}", message.id
+                )
+
+        return [results[media.uuid] for media in media_list]
+
+    def _failed(
+        self, media: Media, error: str, encode_id: Optional[int] = None
+    ) -> schemas.EncodeItemResult:
+        return schemas.EncodeItemResult(
+            media_uuid=media.uuid,
+            status=schemas.EncodeStatusEnum.failed,
+            encode_id=encode_id,
+            error=error,
+        )
+
+    def _build_ffmpeg_command(
+        self, media: Media, preset: Preset, temp_path: Optional[str] = None
+    ):
+        # ffmpeg-python is only needed when encodes are submitted.
+        import ffmpeg
 
-    def _build_ffmpeg_command(self, media: Media, preset: Preset):
         original_path = media.file_path
-        temp_path = self.file_manager.get_encode_temp_path(original_path)
+        temp_path = temp_path or self.file_manager.get_encode_temp_path(original_path)
 
         return ffmpeg.input(original_path).output(
             temp_path,
@@ -51,22 +134,25 @@ class EncodeEnqueuer:
             metadata=f"media_uuid={media.uuid}",
         )
 
-    def _prepare_encode_data(self, media: Media, command) -> QueueEncode:
-        data = schemas.InitializeEncode(
-            media_uuid=media.uuid,
-            status=schemas.EncodeStatusEnum.queued,
-            source_path=media.file_path,
-            temp_path=self.file_manager.get_encode_temp_path(media.file_path),
-            source_size=self.file_manager.get_file_size_mb(media.file_path),
-            command=command.get_args(),
-        )
+    def _enqueue_messages(
+        self, messages: list[QueueEncode]
+    ) -> tuple[int, Optional[Exception]]:
+        if not messages:
+            return 0, None
 
-        encode = repository.initialize_encode(self.db, data)
-        queue_data = QueueEncode.from_orm(encode)
-        queue_data.duration_in_seconds = media.duration
+        priorities = None
+        if self.scheduler.max_priority:
+            priorities = [message.priority for message in messages]
 
-        return queue_data
+        try:
+            published = rabbitmq.producer_pool.publish(
+                RABBITMQ_ENCODE_QUEUE,
+                [message.model_dump_json() for message in messages],
+                priorities,
+            )
+        except rabbitmq.PublishError as e:
+            return e.published, e
+        except Exception as e:
+            return 0, e
 
-    def _enqueue_message(self, message: QueueEncode):
-        rabbitmq_client = rabbitmq.RabbitMQProducer()
-        rabbitmq_client.push_message(RABBITMQ_ENCODE_QUEUE, message.model_dump_json())
+        return published, None
@@ -1,12 +1,13 @@
 import datetime
 from dataclasses import dataclass
-from sqlalchemy import JSON, Column, DateTime, Float, Integer, String
+from sqlalchemy import JSON, Column, DateTime, Float, Index, Integer, String
 from encoder.database import Base
 
 
 @dataclass
 class Encode(Base):
     __tablename__ = "encodes"
+    __table_args__ = (Index("ix_encodes_media_uuid_status", "media_uuid", "status"),)
 
     id = Column(Integer, primary_key=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -18,3 +19,9 @@ class Encode(Base):
     duration_in_seconds = Column(Integer, nullable=True)
     command = Column(JSON, nullable=True)
     media_uuid = Column(String, nullable=True)
+    priority = Column(Integer, nullable=True)
+    # What the source looked like when queued; the media row is re-probed
+    # after the swap and then describes the output instead.
+    source_codec = Column(String, nullable=True)
+    source_dimensions = Column(String, nullable=True)
+    source_duration = Column(Float, nullable=True)
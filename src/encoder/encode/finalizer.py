@@ -0,0 +1,74 @@
+import logging
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from encoder import metrics
+from encoder.database import SessionLocal
+from encoder.encode import repository, schemas
+from encoder.media import file_system
+
+
+class EncodeFinalizer:
+    def __init__(self, session_factory: sessionmaker = SessionLocal):
+        self.session_factory = session_factory
+
+    def finalize(self, finish_encode: schemas.EncodeComplete):
+        with self.session_factory() as db:
+            encode = repository.get_encode_by_uuid(db, finish_encode.id)
+            if not encode:
+                logging.warning(f"Encoding not found: {finish_encode.id}")
+                return
+
+            if encode.status == schemas.EncodeStatusEnum.finished:
+                # Redelivered after the swap already happened.
+                return
+
+            try:
+                self._swap_files(db, encode, finish_encode)
+            except Exception as e:
+                logging.exception(e)
+                db.rollback()
+                encode.status = schemas.EncodeStatusEnum.failed
+                db.commit()
+
+    def _swap_files(self, db, encode, finish_encode: schemas.EncodeComplete):
+        file_manager = file_system.FileManager(db)
+
+        encode.status = schemas.EncodeStatusEnum.finished
+        encode.output_size = file_manager.get_file_size_mb(encode.temp_path)
+        encode.duration_in_seconds = finish_encode.duration
+
+        started_at = time.perf_counter()
+        copied = 0
+        if file_manager.file_exist(encode.source_path):
+            copied += file_manager.move_original_to_temp(encode.source_path)
+            try:
+                copied += file_manager.move_file(encode.temp_path, encode.source_path)
+            except Exception:
+                self._restore_original(file_manager, encode.source_path)
+                raise
+        elapsed = time.perf_counter() - started_at
+
+        db.commit()
+        metrics.record_encode(encode.source_size, encode.output_size)
+
+        throughput = copied / elapsed / 1024 / 1024 if copied and elapsed else 0.0
+        logging.info(
+            f"Finalized encode {encode.id} in {elapsed:.2f}s, "
+            f"copied {copied / 1024 / 1024:.1f} MB at {throughput:.1f} MB/s"
+        )
+
+    def _restore_original(
+        self, file_manager: file_system.FileManager, source_path: str
+    ):
+        # The original is already out of the library; put it back so a failed
+        # swap never leaves the file missing.
+        original_temp = file_manager.get_original_temp_path(source_path)
+        try:
+            file_manager.move_file(original_temp, source_path)
+        except Exception as e:
+            logging.error(f"Unable to restore {source_path} from {original_temp}: {e}")
+
+
+encode_finalizer = EncodeFinalizer()
@@ -0,0 +1,254 @@
+import itertools
+import logging
+import math
+import threading
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from encoder.config import PREDICTION_REFRESH_INTERVAL
+from encoder.encode import repository, schemas
+from encoder.encode.scheduler import parse_dimensions, source_video_codec
+from encoder.media.entity import Media
+from encoder.preset.schemas import Preset
+
+# Pseudo-count pulling a group toward its parent level, so a group with a
+# single finished encode does not decide its own estimate.
+PRIOR_STRENGTH = 3.0
+RESOLUTION_BUCKETS = ((576, "sd"), (720, "720p"), (1080, "1080p"), (2160, "2160p"))
+BASIS = ("global", "preset", "codec", "resolution")
+BYTES_PER_MB = 1024 * 1024
+ESTIMATE_CHUNK_SIZE = 1000
+
+
+def resolution_bucket(dimensions: Optional[str]) -> str:
+    parsed = parse_dimensions(dimensions)
+    if parsed is None:
+        return "unknown"
+
+    # The short side, so portrait video lands in the same bucket.
+    height = min(parsed)
+    for limit, name in RESOLUTION_BUCKETS:
+        if height <= limit:
+            return name
+
+    return "4320p"
+
+
+def command_profile(command: Optional[list]) -> str:
+    # Pairs every argument with the next one; only flag lookups are used.
+    args = dict(zip(command or [], (command or [])[1:]))
+    scale = args.get("-vf", "").removeprefix("scale=").replace(":", "x")
+
+    return "/".join(
+        [
+            args.get("-vcodec", "?"),
+            args.get("-crf", "?"),
+            args.get("-preset", "?"),
+            scale,
+        ]
+    )
+
+
+def preset_profile(preset: Preset) -> str:
+    return "/".join(
+        [
+            preset.VideoEncoder,
+            str(preset.VideoQualitySlider),
+            preset.VideoPreset,
+            f"{preset.PictureWidth}x{preset.PictureHeight}",
+        ]
+    )
+
+
+def hierarchy_keys(profiles: list, codecs: list, resolutions: list) -> list:
+    # Each level's key includes its parents, so groups nest.
+    preset_keys = np.array(profiles, dtype=str)
+    codec_keys = np.char.add(np.char.add(preset_keys, "|"), np.array(codecs, dtype=str))
+    resolution_keys = np.char.add(
+        np.char.add(codec_keys, "|"), np.array(resolutions, dtype=str)
+    )
+
+    return [preset_keys, codec_keys, resolution_keys]
+
+
+class RatioModel:
+    # Geometric mean of a ratio per group at each level of the
+    # preset -> codec -> resolution hierarchy, fitted in log space.
+    def __init__(self, keys: list, log_ratios: np.ndarray):
+        valid = np.isfinite(log_ratios)
+        values = log_ratios[valid]
+
+        self.samples = int(values.size)
+        self.global_mean = float(values.mean()) if self.samples else math.nan
+        self.levels = []
+        for level_keys in keys:
+            groups, inverse = np.unique(level_keys[valid], return_inverse=True)
+            sums = np.bincount(inverse, weights=values, minlength=groups.size)
+            counts = np.bincount(inverse, minlength=groups.size)
+            self.levels.append((groups, sums, counts))
+
+    def predict(self, keys: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        size = keys[0].size
+        estimate = np.full(size, self.global_mean)
+        samples = np.full(size, self.samples)
+        depth = np.zeros(size, dtype=int)
+
+        for level, ((groups, sums, counts), level_keys) in enumerate(
+            zip(self.levels, keys), start=1
+        ):
+            if not groups.size:
+                break
+
+            position = np.clip(np.searchsorted(groups, level_keys), 0, groups.size - 1)
+            found = groups[position] == level_keys
+            group_counts = np.where(found, counts[position], 0)
+            group_sums = np.where(found, sums[position], 0.0)
+
+            # Groups without history keep the parent estimate unchanged.
+            estimate = (group_sums + PRIOR_STRENGTH * estimate) / (
+                group_counts + PRIOR_STRENGTH
+            )
+            samples = np.where(found, group_counts, samples)
+            depth = np.where(found, level, depth)
+
+        return np.exp(estimate), samples, depth
+
+
+class PredictionEngine:
+    def __init__(self, refresh_interval: float = PREDICTION_REFRESH_INTERVAL):
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._models: Optional[tuple[RatioModel, RatioModel]] = None
+        self._signature = None
+        self._checked_at = None
+
+    def models(self, db: Session) -> tuple[RatioModel, RatioModel]:
+        if not self._is_stale():
+            return self._models
+
+        with self._lock:
+            if self._is_stale():
+                signature = repository.get_finished_signature(db)
+                if signature != self._signature:
+                    self._models = self.fit(db)
+                    self._signature = signature
+                self._checked_at = time.monotonic()
+
+        return self._models
+
+    def fit(self, db: Session) -> tuple[RatioModel, RatioModel]:
+        rows = list(repository.get_finished_history(db))
+
+        profiles = [command_profile(row.command) for row in rows]
+        codecs = [row.source_codec or "unknown" for row in rows]
+        resolutions = [resolution_bucket(row.source_dimensions) for row in rows]
+        keys = hierarchy_keys(profiles, codecs, resolutions)
+
+        history = np.array(
+            [
+                (
+                    row.source_size,
+                    row.output_size,
+                    row.duration_in_seconds or math.nan,
+                    row.source_duration or math.nan,
+                )
+                for row in rows
+            ],
+            dtype=float,
+        ).reshape(-1, 4)
+        source_size, output_size, encode_seconds, media_seconds = history.T
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            size_model = RatioModel(keys, np.log(output_size / source_size))
+            # Wall-clock seconds per second of media.
+            time_model = RatioModel(keys, np.log(encode_seconds / media_seconds))
+
+        logging.info(
+            f"Fitted prediction models on {size_model.samples} sizes "
+            f"and {time_model.samples} durations"
+        )
+        return size_model, time_model
+
+    def estimate(
+        self, db: Session, media_list: list[Media], preset: Preset
+    ) -> list[schemas.EncodeEstimate]:
+        if not media_list:
+            return []
+
+        size_model, time_model = self.models(db)
+        keys = hierarchy_keys(
+            [preset_profile(preset)] * len(media_list),
+            [source_video_codec(media) or "unknown" for media in media_list],
+            [resolution_bucket(media.dimensions) for media in media_list],
+        )
+        # Media.file_size is the probed container size in bytes.
+        source_size = np.array(
+            [media.file_size or math.nan for media in media_list], dtype=float
+        ) / BYTES_PER_MB
+        media_seconds = np.array(
+            [media.duration or math.nan for media in media_list], dtype=float
+        )
+
+        size_ratio, samples, depth = size_model.predict(keys)
+        time_ratio, _, _ = time_model.predict(keys)
+        output_size = source_size * size_ratio
+        encode_seconds = media_seconds * time_ratio
+
+        return [
+            schemas.EncodeEstimate(
+                media_uuid=media.uuid,
+                source_size=_finite(source_size[i]),
+                output_size=_finite(output_size[i]),
+                encode_seconds=_finite(encode_seconds[i]),
+                samples=int(samples[i]) if size_model.samples else 0,
+                basis=BASIS[depth[i]] if size_model.samples else "none",
+            )
+            for i, media in enumerate(media_list)
+        ]
+
+    def estimate_selection(
+        self,
+        db: Session,
+        media: Iterable[Media],
+        preset: Preset,
+        include_items: bool = True,
+    ) -> schemas.EncodeEstimateResponse:
+        response = schemas.EncodeEstimateResponse(
+            preset=preset.PresetName,
+            media_count=0,
+            estimated_count=0,
+            source_size=0.0,
+            output_size=0.0,
+            encode_seconds=0.0,
+            items=[] if include_items else None,
+        )
+
+        iterator = iter(media)
+        while chunk := list(itertools.islice(iterator, ESTIMATE_CHUNK_SIZE)):
+            for estimate in self.estimate(db, chunk, preset):
+                response.media_count += 1
+                if estimate.output_size is not None:
+                    response.estimated_count += 1
+                    response.source_size += estimate.source_size
+                    response.output_size += estimate.output_size
+                response.encode_seconds += estimate.encode_seconds or 0.0
+                if include_items:
+                    response.items.append(estimate)
+
+        return response
+
+    def _is_stale(self) -> bool:
+        return (
+            self._checked_at is None
+            or time.monotonic() - self._checked_at >= self._refresh_interval
+        )
+
+
+def _finite(value: float) -> Optional[float]:
+    return round(float(value), 2) if math.isfinite(value) else None
+
+
+prediction_engine = PredictionEngine()
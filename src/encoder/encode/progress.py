@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from pydantic import ValidationError
+
+from encoder.config import PROGRESS_SSE_INTERVAL, PROGRESS_STATE_TTL
+from encoder.database import SessionLocal
+from encoder.encode.schemas import EncodeProgress, EncodeProgressState
+from encoder.media import repository as media_repository
+
+
+def get_media_duration(media_uuid: str) -> Optional[float]:
+    with SessionLocal() as db:
+        media = media_repository.get_by_uuid(db, media_uuid)
+        return media.duration if media else None
+
+
+class _TrackedEncode:
+    def __init__(self, duration: Optional[float]):
+        self.duration = duration
+        self.latest: Optional[EncodeProgress] = None
+        self.rate = None
+        self.updated_at = 0.0
+        self.emitted_at = None
+        self.emitted: Optional[EncodeProgress] = None
+        self.trailing: Optional[asyncio.TimerHandle] = None
+
+
+class ProgressStore:
+    def __init__(
+        self,
+        duration_lookup: Callable[[str], Optional[float]] = get_media_duration,
+        emit_interval: float = PROGRESS_SSE_INTERVAL,
+        ttl: float = PROGRESS_STATE_TTL,
+        smoothing: float = 0.3,
+    ):
+        self.duration_lookup = duration_lookup
+        self.emit_interval = emit_interval
+        self.ttl = ttl
+        self.smoothing = smoothing
+        self._encodes: dict[str, _TrackedEncode] = {}
+        self._publish: Optional[Callable[[str], None]] = None
+
+    def set_publisher(self, publish: Callable[[str], None]):
+        # Receives the trailing updates that are sent outside handle_message.
+        self._publish = publish
+
+    async def handle_message(self, body: str) -> Optional[str]:
+        try:
+            progress = EncodeProgress.model_validate_json(body)
+        except ValidationError as e:
+            logging.error(f"Invalid progress message: {e}")
+            return body
+
+        if progress.media_uuid not in self._encodes:
+            duration = await asyncio.to_thread(
+                self.duration_lookup, progress.media_uuid
+            )
+            self._encodes.setdefault(progress.media_uuid, _TrackedEncode(duration))
+
+        if not self.update(progress):
+            self._schedule_trailing(progress.media_uuid)
+            return None
+
+        return self.state(progress.media_uuid).model_dump_json()
+
+    def _schedule_trailing(self, media_uuid: str):
+        # A throttled update would otherwise leave clients on a stale
+        # percentage until the next message, which may never come.
+        tracked = self._encodes.get(media_uuid)
+        if self._publish is None or tracked is None or tracked.trailing is not None:
+            return
+
+        delay = max(0.0, tracked.emitted_at + self.emit_interval - time.monotonic())
+        tracked.trailing = asyncio.get_running_loop().call_later(
+            delay, self._emit_trailing, media_uuid, tracked
+        )
+
+    def _emit_trailing(self, media_uuid: str, tracked: _TrackedEncode):
+        tracked.trailing = None
+        if self._encodes.get(media_uuid) is not tracked:
+            return
+        if tracked.latest is None or tracked.latest is tracked.emitted:
+            return
+
+        tracked.emitted_at = time.monotonic()
+        tracked.emitted = tracked.latest
+        self._publish(self.state(media_uuid).model_dump_json())
+
+    def update(self, progress: EncodeProgress) -> bool:
+        now = time.monotonic()
+        self._evict(now)
+
+        tracked = self._encodes.setdefault(progress.media_uuid, _TrackedEncode(None))
+        previous = tracked.latest
+
+        if previous is not None:
+            elapsed = (progress.created_at - previous.created_at).total_seconds()
+            if elapsed > 0:
+                rate = (progress.progress - previous.progress) / elapsed
+                if tracked.rate is None:
+                    tracked.rate = rate
+                else:
+                    tracked.rate += self.smoothing * (rate - tracked.rate)
+
+        tracked.latest = progress
+        tracked.updated_at = now
+
+        finished = progress.progress >= 100
+        if (
+            finished
+            or tracked.emitted_at is None
+            or now - tracked.emitted_at >= self.emit_interval
+        ):
+            tracked.emitted_at = now
+            tracked.emitted = progress
+            return True
+
+        return False
+
+    def state(self, media_uuid: str) -> Optional[EncodeProgressState]:
+        tracked = self._encodes.get(media_uuid)
+        if tracked is None or tracked.latest is None:
+            return None
+
+        speed = None
+        eta_seconds = None
+        if tracked.rate and tracked.rate > 0:
+            eta_seconds = max(0.0, 100 - tracked.latest.progress) / tracked.rate
+            if tracked.duration:
+                speed = tracked.rate / 100 * tracked.duration
+
+        return EncodeProgressState(
+            **tracked.latest.model_dump(),
+            duration_in_seconds=tracked.duration,
+            speed=speed,
+            eta_seconds=eta_seconds,
+        )
+
+    def snapshot(self) -> list[EncodeProgressState]:
+        self._evict(time.monotonic())
+
+        states = (self.state(media_uuid) for media_uuid in list(self._encodes))
+        return [state for state in states if state is not None]
+
+    def _evict(self, now: float):
+        expired = [
+            media_uuid
+            for media_uuid, tracked in self._encodes.items()
+            if tracked.latest is not None and now - tracked.updated_at > self.ttl
+        ]
+        for media_uuid in expired:
+            tracked = self._encodes.pop(media_uuid)
+            if tracked.trailing is not None:
+                tracked.trailing.cancel()
+
+
+progress_store = ProgressStore()
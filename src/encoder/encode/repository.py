@@ -1,7 +1,10 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from encoder.database import chunks
 from encoder.encode import schemas as encode_schemas
 from encoder.encode.entity import Encode
+from encoder.media.entity import Media
 
 
 def initialize_encode(db: Session, data: encode_schemas.InitializeEncode) -> Encode:
@@ -13,6 +16,29 @@ def initialize_encode(db: Session, data: encode_schemas.InitializeEncode) -> Enc
     return db_encode
 
 
+def initialize_encodes(
+    db: Session, data: list[encode_schemas.InitializeEncode]
+) -> list[encode_schemas.QueueEncode]:
+    encodes = [Encode(**item.model_dump()) for item in data]
+    db.add_all(encodes)
+    db.flush()
+    # Read before the commit expires the rows, which would otherwise reload
+    # each one separately.
+    queued = [encode_schemas.QueueEncode.model_validate(encode) for encode in encodes]
+    db.commit()
+
+    return queued
+
+
+def mark_failed(db: Session, ids: list[int]) -> None:
+    for chunk in chunks(ids):
+        db.query(Encode).filter(Encode.id.in_(chunk)).update(
+            {Encode.status: encode_schemas.EncodeStatusEnum.failed.value},
+            synchronize_session=False,
+        )
+    db.commit()
+
+
 def get_encode_by_uuid(db: Session, id: int) -> Encode:
     return db.query(Encode).filter(Encode.id == id).first()
 
@@ -27,8 +53,28 @@ def get_encode_by_uuid_and_status(
     )
 
 
+def get_queued_media_uuids(
+    db: Session, media_uuids: list[str], status: str = "queued"
+) -> set[str]:
+    queued = set()
+    for chunk in chunks(media_uuids):
+        rows = (
+            db.query(Encode.media_uuid)
+            .filter(Encode.media_uuid.in_(chunk), Encode.status == status)
+            .distinct()
+        )
+        queued.update(media_uuid for (media_uuid,) in rows)
+
+    return queued
+
+
 def get_queued(db: Session) -> Encode:
-    return db.query(Encode).filter(Encode.status == "queued").all()
+    return (
+        db.query(Encode)
+        .filter(Encode.status == "queued")
+        .order_by(Encode.priority.desc().nulls_last(), Encode.id)
+        .all()
+    )
 
 
 def delete(db: Session, id: int) -> None:
@@ -61,3 +107,36 @@ def update_encode(
 
 def list_encodes_by_uuid(db: Session, uuid: str):
     return db.query(Encode).filter(Encode.media_uuid == uuid).all()
+
+
+def get_finished_signature(db: Session) -> tuple:
+    return tuple(
+        db.query(func.count(Encode.id), func.max(Encode.id))
+        .filter(Encode.status == encode_schemas.EncodeStatusEnum.finished.value)
+        .one()
+    )
+
+
+def get_finished_history(db: Session, batch_size: int = 1000):
+    # Encodes queued before the source_* columns existed only get a duration
+    # from the media row; its codec and dimensions describe the output by now.
+    return (
+        db.query(
+            Encode.command,
+            Encode.source_size,
+            Encode.output_size,
+            Encode.duration_in_seconds,
+            Encode.source_codec,
+            Encode.source_dimensions,
+            func.coalesce(Encode.source_duration, Media.duration).label(
+                "source_duration"
+            ),
+        )
+        .outerjoin(Media, Media.uuid == Encode.media_uuid)
+        .filter(
+            Encode.status == encode_schemas.EncodeStatusEnum.finished.value,
+            Encode.source_size > 0,
+            Encode.output_size > 0,
+        )
+        .yield_per(batch_size)
+    )
@@ -0,0 +1,126 @@
+import math
+from typing import Optional
+
+from encoder.config import ENCODE_QUEUE_MAX_PRIORITY
+from encoder.media.entity import Media
+from encoder.preset.schemas import Preset
+
+# Rough output bitrate of the presets, in bits per output pixel per frame.
+TARGET_BITS_PER_PIXEL = 0.05
+ASSUMED_FRAME_RATE = 24.0
+# Pixels one CPU core decodes and encodes per second; only the ratio between
+# media matters for ordering, so this needs to be roughly right, not exact.
+CPU_PIXELS_PER_SECOND = 1920 * 1080 * ASSUMED_FRAME_RATE / 4
+
+# Sources already in an efficient codec rarely shrink by as much as the
+# bitrate alone suggests.
+CODEC_SAVINGS_FACTOR = {
+    "av1": 0.3,
+    "hevc": 0.5,
+    "h265": 0.5,
+    "vp9": 0.6,
+}
+
+# Scores are bucketed on a log scale between these bounds, in bytes saved
+# per CPU-second, so priorities stay comparable across enqueue requests.
+MIN_SCORE = 1e3
+MAX_SCORE = 1e7
+
+
+def parse_dimensions(dimensions: Optional[str]) -> Optional[tuple[int, int]]:
+    if not dimensions:
+        return None
+
+    try:
+        width, height = map(int, dimensions.split("x"))
+    except ValueError:
+        return None
+
+    return width, height
+
+
+def source_video_codec(media: Media) -> Optional[str]:
+    for track in media.video_codec or []:
+        if isinstance(track, dict):
+            codec = track.get("codec") or track.get("codec_name")
+        else:
+            codec = track
+        if codec:
+            return str(codec).lower()
+
+    return None
+
+
+class EncodeScheduler:
+    def __init__(self, max_priority: int = ENCODE_QUEUE_MAX_PRIORITY):
+        self.max_priority = max(0, min(max_priority, 255))
+
+    def can_pin(self, priority: int) -> bool:
+        # Pins are stored on the encode as given, so they have to be a
+        # priority the queue can actually deliver in.
+        return 0 <= priority <= self.max_priority
+
+    def score(self, media: Media, preset: Preset) -> Optional[float]:
+        dimensions = parse_dimensions(media.dimensions)
+        if not media.file_size or not media.duration or not dimensions:
+            return None
+
+        source_pixels = dimensions[0] * dimensions[1]
+        output_pixels = source_pixels
+        if preset.PictureWidth and preset.PictureHeight:
+            output_pixels = min(
+                source_pixels, preset.PictureWidth * preset.PictureHeight
+            )
+
+        frames = media.duration * ASSUMED_FRAME_RATE
+        expected_output = frames * output_pixels * TARGET_BITS_PER_PIXEL / 8
+        saved = max(0.0, media.file_size - expected_output)
+        saved *= CODEC_SAVINGS_FACTOR.get(source_video_codec(media), 1.0)
+
+        cpu_seconds = frames * source_pixels / CPU_PIXELS_PER_SECOND
+        return saved / cpu_seconds
+
+    def priority(self, score: Optional[float]) -> int:
+        if self.max_priority == 0:
+            return 0
+        if score is None:
+            return self.max_priority // 2
+        if score <= MIN_SCORE:
+            return 0
+
+        position = math.log(min(score, MAX_SCORE) / MIN_SCORE) / math.log(
+            MAX_SCORE / MIN_SCORE
+        )
+        return round(position * self.max_priority)
+
+    def schedule(
+        self,
+        media_list: list[Media],
+        preset: Preset,
+        pinned_priority: Optional[int] = None,
+    ) -> list[tuple[Media, int]]:
+        if pinned_priority is not None and not self.can_pin(pinned_priority):
+            raise ValueError(
+                f"Priority {pinned_priority} is above the queue's maximum "
+                f"of {self.max_priority}"
+            )
+
+        scheduled = []
+        for media in media_list:
+            score = self.score(media, preset)
+            if pinned_priority is not None:
+                priority = pinned_priority
+            else:
+                priority = self.priority(score)
+            scheduled.append((media, priority, score))
+
+        # Highest priority first, then the best savings per CPU-second within
+        # a priority; unknown scores go last within their bucket.
+        scheduled.sort(
+            key=lambda item: (-item[1], item[2] is None, -(item[2] or 0.0))
+        )
+
+        return [(media, priority) for media, priority, _ in scheduled]
+
+
+encode_scheduler = EncodeScheduler()
@@ -4,6 +4,8 @@ from typing import Optional
 
 from pydantic import BaseModel, Field
 
+from encoder.media.schemas import FieldEnum, OperatorEnum
+
 
 class EncodeBase(BaseModel):
     created_at: datetime
@@ -32,6 +34,14 @@ class EncodeProgress(BaseModel):
     file_name: str
 
 
+class EncodeProgressState(EncodeProgress):
+    duration_in_seconds: Optional[float] = None
+    speed: Optional[float] = Field(
+        default=None, description="Encoded media seconds per wall-clock second"
+    )
+    eta_seconds: Optional[float] = None
+
+
 class EncodeStatusEnum(str, Enum):
     queued = "queued"
     started = "started"
@@ -45,6 +55,10 @@ class InitializeEncode(BaseEncode):
     temp_path: str
     source_size: float
     command: list
+    priority: Optional[int] = None
+    source_codec: Optional[str] = None
+    source_dimensions: Optional[str] = None
+    source_duration: Optional[float] = None
 
 
 class QueueEncode(BaseModel):
@@ -55,6 +69,7 @@ class QueueEncode(BaseModel):
     command: list
     created_at: datetime
     duration_in_seconds: Optional[float] = None
+    priority: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -80,6 +95,7 @@ class QueduedEncodeView(BaseEncode):
     source_size: float
     created_at: datetime
     command: Optional[list] = None
+    priority: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -97,6 +113,60 @@ class FinishEncode(BaseEncode):
 class EncodeCommand(BaseModel):
     preset: str
     media_ids: list[str]
+    priority: Optional[int] = Field(
+        default=None,
+        ge=0,
+        le=255,
+        description="Pins the queue priority instead of scheduling by savings; "
+        "must not exceed ENCODE_QUEUE_MAX_PRIORITY",
+    )
+
+
+class EncodeItemResult(BaseModel):
+    media_uuid: str
+    status: EncodeStatusEnum
+    encode_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkEncodeResponse(BaseModel):
+    queued: int
+    failed: int
+    results: list[EncodeItemResult]
+
+
+class EncodeEstimateCommand(BaseModel):
+    preset: str
+    media_ids: Optional[list[str]] = Field(
+        default=None, description="Estimates the filtered selection when omitted"
+    )
+    field: Optional[FieldEnum] = None
+    operator: Optional[OperatorEnum] = None
+    value: Optional[str] = None
+    include_items: bool = True
+
+
+class EncodeEstimate(BaseModel):
+    media_uuid: str
+    source_size: Optional[float] = None
+    output_size: Optional[float] = None
+    encode_seconds: Optional[float] = None
+    samples: int = Field(
+        default=0, description="Finished encodes behind the most specific model"
+    )
+    basis: str = Field(
+        default="none", description="Options: none, global, preset, codec, resolution"
+    )
+
+
+class EncodeEstimateResponse(BaseModel):
+    preset: str
+    media_count: int
+    estimated_count: int
+    source_size: float
+    output_size: float
+    encode_seconds: float
+    items: Optional[list[EncodeEstimate]] = None
 
 
 class EncodeQuery(BaseModel):
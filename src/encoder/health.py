@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from encoder.config import (
+    HEALTH_CHECK_INTERVAL,
+    HEALTH_CHECK_TIMEOUT,
+    HEALTH_CHECK_TTL,
+    RABBITMQ_MANAGEMENT_URL,
+)
+from encoder.database import SessionLocal
+from encoder.setting import repository as setting_repository
+from encoder.setting.schemas import SettingKeyEnum
+
+
+def check_path(path: Optional[str]) -> bool:
+    if not path:
+        return False
+    return os.path.isdir(path) and os.access(path, os.W_OK)
+
+
+class HealthMonitor:
+    def __init__(
+        self,
+        interval: float = HEALTH_CHECK_INTERVAL,
+        timeout: float = HEALTH_CHECK_TIMEOUT,
+        ttl: float = HEALTH_CHECK_TTL,
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.ttl = ttl
+        self._snapshot = {
+            "scan_path": False,
+            "temp_path": False,
+            "rabbitmq": False,
+            "rabbitmq_error": "Health check has not run yet",
+        }
+        self._checked_at = None
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def invalidate(self):
+        # Called from sync endpoints running in the threadpool.
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def snapshot(self) -> dict:
+        snapshot = dict(self._snapshot)
+
+        if self._checked_at is None or time.monotonic() - self._checked_at > self.ttl:
+            # A monitor that stopped refreshing must not keep reporting healthy.
+            error = snapshot.get("rabbitmq_error") or "Health check is stale"
+            snapshot.update(
+                scan_path=False, temp_path=False, rabbitmq=False, rabbitmq_error=error
+            )
+
+        return snapshot
+
+    async def refresh(self):
+        (rabbitmq, rabbitmq_error), (scan_path, temp_path) = await asyncio.gather(
+            self._check_rabbitmq(), asyncio.to_thread(self._check_paths)
+        )
+
+        self._snapshot = {
+            "scan_path": scan_path,
+            "temp_path": temp_path,
+            "rabbitmq": rabbitmq,
+            "rabbitmq_error": rabbitmq_error,
+        }
+        self._checked_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f"Health check failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _check_rabbitmq(self) -> tuple[bool, Optional[str]]:
+        import httpx
+
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.get(RABBITMQ_MANAGEMENT_URL)
+            data = response.json()
+
+            if response.status_code != 200 or data["status"] != "ok":
+                return False, "RabbitMQ is not healthy"
+
+            return True, None
+
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            return False, f"Failed to connect to RabbitMQ: {e}"
+
+    def _check_paths(self) -> tuple[bool, bool]:
+        with SessionLocal() as db:
+            scan_paths = [
+                setting.value
+                for setting in setting_repository.get_by_key(
+                    db, SettingKeyEnum.scan_path
+                )
+            ]
+            temp_path = setting_repository.get_setting(db, SettingKeyEnum.temp_path)
+
+        is_scan_path_ok = any(check_path(path) for path in scan_paths)
+        is_temp_path_ok = check_path(temp_path.value if temp_path else None)
+
+        return is_scan_path_ok, is_temp_path_ok
+
+
+health_monitor = HealthMonitor()
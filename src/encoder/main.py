@@ -1,23 +1,20 @@
-from fastapi import FastAPI, status
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from encoder.setting import entity
-from encoder.database import engine, get_db
-from encoder.media import file_system
-from encoder.encode.consumer import MediaEncodeQueueConsumer
-from encoder.rabbitmq import RabbitMQConsumer
-from pydantic import ValidationError
-from encoder.config import RABBITMQ_ENCODE_RESULTS_QUEUE, RABBITMQ_PROBE_RESULT_QUEUE
-from starlette.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from encoder.setting import entity  # noqa: F401
+from encoder import metrics, migrations
+from encoder.rabbitmq import producer_pool
+from encoder.sse import progress_hub
+from encoder.health import health_monitor
+from encoder.middleware import RequestMiddleware
+from encoder.config import DB_AUTO_MIGRATE, RUN_CONSUMERS_IN_API
 from encoder.encode.api import router as encoder_api
 from encoder.media.api import router as media_api
 from encoder.setting.api import router as setting_api
 from encoder.preset.api import router as preset_api
 from encoder.permissions.api import router as permission_api
 from encoder.api import router as main_api
-from encoder.media.consumer import MediaDataQueueConsumer
-from fastapi.responses import JSONResponse
+from encoder.worker import worker
 import logging
 from encoder.logging import configure_logging
 import threading
@@ -25,86 +22,48 @@ import threading
 log = logging.getLogger(__name__)
 configure_logging()
 
-entity.Base.metadata.create_all(bind=engine)
 api = FastAPI()
-consumers = []
 
 
 @api.on_event("startup")
 async def startup_event():
-    try:
-        db = next(get_db())
-        fileManager = file_system.FileManager(db)
+    if DB_AUTO_MIGRATE:
+        # The schema has to exist before requests are served; the codec
+        # backfill can catch up in the background.
+        await run_in_threadpool(migrations.migrate)
+        threading.Thread(
+            target=migrations.backfill, name="backfill-codecs", daemon=True
+        ).start()
 
-        # Media Encode Consumer
-        media_consumer = MediaEncodeQueueConsumer(db, fileManager)
-        encode_connection = RabbitMQConsumer()
-        encode_connection.start(
-            RABBITMQ_ENCODE_RESULTS_QUEUE, media_consumer.on_message_receive
-        )
-        consumers.append(encode_connection)
+    if metrics.exporter is not None:
+        metrics.exporter.start()
 
-        # Scan Consumer
-        scan_consumer = MediaDataQueueConsumer(db)
-        scan_connection = RabbitMQConsumer()
-        scan_connection.start(
-            RABBITMQ_PROBE_RESULT_QUEUE, scan_consumer.on_message_receive
-        )
+    await health_monitor.start()
+    await progress_hub.start()
 
-        consumers.append(scan_connection)
-
-    except Exception as e:
-        logging.error(f"Failed to connect to RabbitMQ: {e}")
+    if RUN_CONSUMERS_IN_API:
+        worker.start()
 
 
 @api.on_event("shutdown")
 async def shutdown_event():
     all_threads = threading.enumerate()
 
-    for consumer in consumers:
-        consumer.stop()
+    await progress_hub.stop()
+    await health_monitor.stop()
+
+    worker.stop()
+
+    if metrics.exporter is not None:
+        metrics.exporter.stop()
+
+    producer_pool.close()
 
     for thread in all_threads:
         if thread is not threading.current_thread():
             thread.join(timeout=2)
 
 
-class ExceptionMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> StreamingResponse:
-        try:
-            response = await call_next(request)
-        except ValidationError as e:
-            log.exception(e)
-            response = JSONResponse(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                content={"detail": e.errors()},
-            )
-        except ValueError as e:
-            log.exception(e)
-            response = JSONResponse(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                content={
-                    "detail": [
-                        {"msg": "Unknown", "loc": ["Unknown"], "type": "Unknown"}
-                    ]
-                },
-            )
-        except Exception as e:
-            log.exception(e)
-            response = JSONResponse(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                content={
-                    "detail": [
-                        {"msg": "Unknown", "loc": ["Unknown"], "type": "Unknown"}
-                    ]
-                },
-            )
-
-        return response
-
-
 api.include_router(media_api)
 api.include_router(encoder_api)
 api.include_router(setting_api)
@@ -120,4 +79,4 @@ api.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-api.add_middleware(ExceptionMiddleware)
+api.add_middleware(RequestMiddleware)
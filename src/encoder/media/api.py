@@ -1,21 +1,44 @@
 import os
+from typing import Optional
 from fastapi import Depends, HTTPException, APIRouter
 from sqlalchemy.orm import Session
 from encoder.media import repository, schemas
 from encoder.database import get_db
-from encoder.media.enqueuer import MediaEnqueuer
-from encoder.permissions.security import decorate_media_with_permissions
+from encoder.media.scan_job import scan_jobs
+from encoder.permissions.security import decorate_media_list_with_permissions
 
 
 router = APIRouter()
 
 
-@router.post("/api/scan", tags=["media"], status_code=204)
-def scan(
-    db: Session = Depends(get_db),
-):
-    scanner = MediaEnqueuer(db)
-    scanner.process_all_media_files()
+@router.post(
+    "/api/scan", tags=["media"], status_code=202, response_model=schemas.ScanJobView
+)
+def scan(full_rescan: bool = False) -> schemas.ScanJobView:
+    return scan_jobs.start(full_rescan=full_rescan)
+
+
+@router.get("/api/scan/{job_id}", tags=["media"], response_model=schemas.ScanJobView)
+def read_scan(job_id: str) -> schemas.ScanJobView:
+    job = scan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Scan {job_id} not found")
+
+    return job
+
+
+@router.delete(
+    "/api/scan/{job_id}",
+    tags=["media"],
+    status_code=202,
+    response_model=schemas.ScanJobView,
+)
+def cancel_scan(job_id: str) -> schemas.ScanJobView:
+    job = scan_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Scan {job_id} not found")
+
+    return job
 
 
 @router.get(
@@ -28,13 +51,23 @@ def list_media(
     db: Session = Depends(get_db),
 ) -> schemas.PaginationResponse:
     media = repository.get_by_filter(db, filter)
-
-    for item in media.items:
-        decorate_media_with_permissions(item)
+    decorate_media_list_with_permissions(db, media.items)
 
     return media
 
 
+@router.get(
+    "/api/media/codecs",
+    response_model=list[schemas.CodecFacet],
+    tags=["media"],
+)
+def list_codec_facets(
+    track_type: Optional[schemas.TrackTypeEnum] = None,
+    db: Session = Depends(get_db),
+) -> list[schemas.CodecFacet]:
+    return repository.get_codec_facets(db, track_type)
+
+
 @router.post("/api/directory/validate", tags=["directory"], status_code=204)
 def validate(
     command: schemas.ScanCommand,
@@ -1,28 +1,105 @@
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
+from encoder.config import PROBE_RESULT_BATCH_LINGER, PROBE_RESULT_BATCH_SIZE
 from encoder.media import repository, schemas
 
 
 class MediaDataQueueConsumer:
-    def __init__(self, db: Session):
-        self.db = db
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        batch_size: int = PROBE_RESULT_BATCH_SIZE,
+        linger: float = PROBE_RESULT_BATCH_LINGER,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.linger = linger
+        self._pending = []
+        self._linger_timer = None
 
     def on_message_receive(self, channel, method, properties, body):
         logging.info(f"Received message: {body}")
 
+        if self.batch_size == 1:
+            self._process_message(body)
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        if self._pending and self._pending[-1][0] is not channel:
+            # The consumer reconnected. The broker redelivers the old channel's
+            # unacked messages, and its linger timer died with its connection.
+            logging.warning(
+                f"Dropping {len(self._pending)} pending messages from a closed channel"
+            )
+            self._pending = []
+            self._linger_timer = None
+
+        self._pending.append((channel, method.delivery_tag, body))
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._linger_timer is None:
+            self._linger_timer = channel.connection.call_later(
+                self.linger, self._on_linger_timeout
+            )
+
+    def flush(self):
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        channel, last_delivery_tag, _ = batch[-1]
+
+        if self._linger_timer is not None:
+            channel.connection.remove_timeout(self._linger_timer)
+            self._linger_timer = None
+
         try:
-            data = schemas.MediaCreate.model_validate_json(body)
-            media = repository.get_by_uuid(
-                self.db, data.uuid
-            ) or repository.get_by_file_path(self.db, data.file_path)
-
-            if media:
-                if repository.should_update(data, media):
-                    repository.update_media(self.db, media, data)
-            else:
-                logging.info(f"Creating new media: {data.file_path}")
-                repository.create_media(self.db, data)
+            items = self._parse_batch([body for _, _, body in batch])
+            with self.session_factory() as db:
+                repository.save_media_batch(db, items)
         except Exception as e:
-            logging.error(f"Error processing message: {e}")
+            logging.error(f"Error processing batch, retrying one by one: {e}")
+            for _, _, body in batch:
+                self._process_message(body)
+
+        # Acks only once the batch is committed; the broker redelivers
+        # everything after the last ack if the consumer dies mid-batch.
+        if channel.is_open:
+            channel.basic_ack(delivery_tag=last_delivery_tag, multiple=True)
+        else:
+            logging.warning("Channel closed before the batch was acked")
+
+    def _on_linger_timeout(self):
+        self._linger_timer = None
+        self.flush()
+
+    def _parse_batch(self, bodies: list) -> list[schemas.MediaCreate]:
+        items = []
+        for body in bodies:
+            try:
+                items.append(schemas.MediaCreate.model_validate_json(body))
+            except Exception as e:
+                logging.error(f"Error processing message: {e}")
+
+        return items
+
+    def _process_message(self, body):
+        with self.session_factory() as db:
+            try:
+                self._save_message(db, body)
+            except Exception as e:
+                logging.error(f"Error processing message: {e}")
+
+    def _save_message(self, db: Session, body):
+        data = schemas.MediaCreate.model_validate_json(body)
+        media = repository.get_by_uuid(db, data.uuid) or repository.get_by_file_path(
+            db, data.file_path
+        )
 
-        channel.basic_ack(delivery_tag=method.delivery_tag)
+        if media:
+            if repository.should_update(data, media):
+                repository.update_media(db, media, data)
+        else:
+            logging.info(f"Creating new media: {data.file_path}")
+            repository.create_media(db, data)
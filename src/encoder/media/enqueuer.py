@@ -1,42 +1,220 @@
+import datetime
+import itertools
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional
 from sqlalchemy.orm import Session
 from encoder.media import schemas
-from encoder.media.file_system import DirectoryScanner
-from encoder.rabbitmq import RabbitMQProducer
-from encoder.config import RABBITMQ_PROBE_QUEUE
+from encoder.media.file_system import (
+    DirectoryScanner,
+    ScannedFile,
+    compute_fingerprint,
+)
+from encoder.rabbitmq import producer_pool
+from encoder.config import FINGERPRINT_WORKERS, RABBITMQ_PROBE_QUEUE, SCAN_CHUNK_SIZE
 from encoder.media import repository
 
 
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class ScanCancelled(Exception):
+    pass
+
+
 class MediaEnqueuer:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        progress: Optional[schemas.ScanProgress] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ):
         self.db = db
         self.scanner = DirectoryScanner(db)
-        self.rabbitmq_client = RabbitMQProducer()
+        self.progress = progress or schemas.ScanProgress()
+        self.cancel_event = cancel_event or threading.Event()
+        self.timings = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def process_all_media_files(self, full_rescan: bool = False):
+        scan_started_at = datetime.datetime.utcnow()
+        started_at = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=FINGERPRINT_WORKERS) as executor:
+            self._executor = executor
+            try:
+                for chunk in chunked(self.scanner.iter_media_files(), SCAN_CHUNK_SIZE):
+                    if self.cancel_event.is_set():
+                        raise ScanCancelled()
+
+                    self.progress.enqueued += self.process_chunk(
+                        chunk, scan_started_at, full_rescan
+                    )
+                    self.progress.files_found += len(chunk)
+                    self.progress.directories = sum(
+                        report.directories for report in self.scanner.root_reports
+                    )
+            finally:
+                self._executor = None
+
+        self.progress.directories = sum(
+            report.directories for report in self.scanner.root_reports
+        )
+        self.timings["scan"] = time.perf_counter() - started_at
+        logging.info(
+            f"Enqueued {self.progress.enqueued} "
+            f"of {self.progress.files_found} media files"
+        )
+
+        if self.cancel_event.is_set():
+            raise ScanCancelled()
+
+        started_at = time.perf_counter()
+        self.progress.removed = self.remove_deleted_media_entries(scan_started_at)
+        self.timings["reconcile"] = time.perf_counter() - started_at
+
+    def process_chunk(
+        self,
+        chunk: List[ScannedFile],
+        scan_started_at: datetime.datetime,
+        full_rescan: bool = False,
+    ) -> int:
+        file_paths = [media_file.file_path for media_file in chunk]
+        index = repository.get_file_index(self.db, file_paths)
+        probed_paths = repository.get_existing_file_paths(self.db, file_paths)
+
+        fingerprints = self.fingerprint_files(chunk, index)
+        moved = self.move_renamed_media(chunk, fingerprints, probed_paths)
+
+        changed = [
+            media_file.file_path
+            for media_file in chunk
+            if media_file.file_path not in moved
+            and (full_rescan or self.has_changed(media_file, index, probed_paths))
+        ]
+        self.enqueue_files_for_processing(changed)
+
+        repository.save_file_index(self.db, chunk, scan_started_at, fingerprints)
 
-    def process_all_media_files(self):
-        media_files = self.scanner.scan_for_media_files()
+        return len(changed)
 
-        for media_file in media_files:
-            self.enqueue_file_for_processing(media_file)
+    def has_changed(
+        self,
+        media_file: ScannedFile,
+        index: dict[str, repository.IndexEntry],
+        probed_paths: set[str],
+    ) -> bool:
+        if media_file.file_path not in probed_paths:
+            return True
 
-        self.rabbitmq_client.close()
-        self.remove_unprocessed_media_entries(media_files)
+        entry = index.get(media_file.file_path)
+        return entry is None or entry.stat != media_file
+
+    def fingerprint_files(
+        self,
+        chunk: List[ScannedFile],
+        index: dict[str, repository.IndexEntry],
+    ) -> dict[str, str]:
+        fingerprints = {}
+        pending = []
+        for media_file in chunk:
+            entry = index.get(media_file.file_path)
+            # An unchanged stat means unchanged content, so the stored
+            # fingerprint is reused instead of reading the file again.
+            if entry and entry.stat == media_file and entry.fingerprint:
+                fingerprints[media_file.file_path] = entry.fingerprint
+            else:
+                pending.append(media_file)
+
+        mapper = self._executor.map if self._executor else map
+        computed = mapper(
+            lambda media_file: compute_fingerprint(
+                media_file.file_path, media_file.size
+            ),
+            pending,
+        )
+        for media_file, fingerprint in zip(pending, computed):
+            if fingerprint:
+                fingerprints[media_file.file_path] = fingerprint
+
+        return fingerprints
+
+    def move_renamed_media(
+        self,
+        chunk: List[ScannedFile],
+        fingerprints: dict[str, str],
+        probed_paths: set[str],
+    ) -> set[str]:
+        unknown = {
+            media_file.file_path: fingerprints[media_file.file_path]
+            for media_file in chunk
+            if media_file.file_path not in probed_paths
+            and media_file.file_path in fingerprints
+        }
+        if not unknown:
+            return set()
+
+        candidates = repository.get_indexed_paths_by_fingerprint(
+            self.db, list(set(unknown.values()))
+        )
+        old_paths = {
+            path
+            for paths in candidates.values()
+            for path in paths
+            if path not in unknown and not os.path.exists(path)
+        }
+        old_probed = repository.get_existing_file_paths(self.db, list(old_paths))
+
+        moved = set()
+        for new_path, fingerprint in unknown.items():
+            old_path = next(
+                (
+                    path
+                    for path in candidates.get(fingerprint, [])
+                    if path in old_probed
+                ),
+                None,
+            )
+            if old_path is None:
+                continue
+
+            # Each old path can only be claimed by one of its copies.
+            old_probed.discard(old_path)
+            if repository.move_media(self.db, old_path, new_path):
+                logging.info(f"Detected rename {old_path} -> {new_path}")
+                moved.add(new_path)
+
+        return moved
+
+    def enqueue_files_for_processing(self, media_files: List[str]):
+        messages = [
+            schemas.QueueScan(source_path=media_file).model_dump_json()
+            for media_file in media_files
+        ]
+        self._enqueue_messages(messages)
 
     def enqueue_file_for_processing(self, media_file):
-        try:
-            message = schemas.QueueScan(source_path=media_file)
-            self._enqueue_message(message)
-        except Exception as e:
-            logging.error(f"Error enqueuing {media_file}: {e}")
-
-    def _enqueue_message(self, message: schemas.QueueScan):
-        self.rabbitmq_client.push_message(
-            RABBITMQ_PROBE_QUEUE, message.model_dump_json()
+        self.enqueue_files_for_processing([media_file])
+
+    def _enqueue_messages(self, messages: List[str]):
+        if messages:
+            producer_pool.publish(RABBITMQ_PROBE_QUEUE, messages)
+
+    def remove_deleted_media_entries(self, scan_started_at: datetime.datetime):
+        removed_media = repository.delete_unindexed_media(self.db, scan_started_at)
+        removed_files = repository.delete_stale_indexed_files(
+            self.db, scan_started_at
+        )
+
+        logging.info(
+            f"Removed {removed_media} media entries "
+            f"and {removed_files} index entries no longer on disk"
         )
 
-    def remove_unprocessed_media_entries(self, files):
-        for media in repository.all(self.db):
-            if media.file_path not in files:
-                logging.info(f"Removing media entry {media.file_path}")
-                self.db.delete(media)
-                self.db.commit()
+        return removed_media
@@ -2,7 +2,19 @@ import datetime
 from dataclasses import dataclass
 from typing import ClassVar, Optional
 
-from sqlalchemy import JSON, Column, DateTime, Float, Integer, String
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    text,
+)
 
 from encoder.database import Base
 
@@ -10,6 +22,14 @@ from encoder.database import Base
 @dataclass
 class Media(Base):
     __tablename__ = "media"
+    # One index per OrderByEnum option; id is the keyset pagination tiebreaker.
+    __table_args__ = (
+        Index("ix_media_file_size_id", "file_size", "id"),
+        Index("ix_media_file_path_id", "file_path", "id"),
+        Index("ix_media_file_name_id", "file_name", "id"),
+        Index("ix_media_created_at_id", "created_at", "id"),
+        Index("ix_media_updated_at_id", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     uuid = Column(String, nullable=False, index=True, unique=True)
@@ -27,3 +47,63 @@ class Media(Base):
     )
 
     permissions: ClassVar[Optional[dict]] = {}
+
+
+@dataclass
+class MediaCodec(Base):
+    __tablename__ = "media_codecs"
+    __table_args__ = (
+        Index("ix_media_codecs_track_type_codec", "track_type", "codec", "media_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    media_id = Column(
+        Integer, ForeignKey("media.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    track_type = Column(String, nullable=False)
+    codec = Column(String, nullable=False)
+    language = Column(String, nullable=True)
+
+
+@dataclass
+class IndexedFile(Base):
+    __tablename__ = "file_index"
+
+    id = Column(Integer, primary_key=True)
+    file_path = Column(String, nullable=False, index=True, unique=True)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    inode = Column(BigInteger, nullable=False)
+    device = Column(BigInteger, nullable=False)
+    seen_at = Column(DateTime, nullable=False, index=True)
+    fingerprint = Column(String, nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(
+        DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow
+    )
+
+
+@dataclass
+class ScanJobRecord(Base):
+    __tablename__ = "scan_jobs"
+    # At most one running scan, however many API processes serve requests.
+    __table_args__ = (
+        Index(
+            "ix_scan_jobs_running",
+            "status",
+            unique=True,
+            sqlite_where=text("status = 'running'"),
+        ),
+    )
+
+    id = Column(String, primary_key=True)
+    status = Column(String, nullable=False)
+    full_rescan = Column(Boolean, nullable=False, default=False)
+    progress = Column(JSON, nullable=True)
+    timings = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    elapsed = Column(Float, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    started_at = Column(DateTime, nullable=False, index=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=False)
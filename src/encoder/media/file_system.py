@@ -1,19 +1,200 @@
+import errno
+import hashlib
+import heapq
 import logging
+import mmap
 import os
+import shutil
+import time
 import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from stat import S_ISREG
 from sqlalchemy.orm import Session
-from encoder.config import MEDIA_EXTENSIONS, EXCLUDE_FOLDERS, TEMP_FOLDER
+from encoder import metrics
+from encoder.config import MEDIA_EXTENSIONS, EXCLUDE_FOLDERS, SCAN_WORKERS, TEMP_FOLDER
 from encoder.setting import entity
 from encoder.setting import repository as setting_repository
 from encoder.setting.schemas import SettingKeyEnum
-from typing import List
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+
+_UNSUPPORTED_COPY_ERRORS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+}
+
+
+class ScannedFile(NamedTuple):
+    file_path: str
+    size: int
+    mtime_ns: int
+    inode: int
+    device: int
+
+    @classmethod
+    def from_stat(cls, file_path: str, stat: os.stat_result) -> "ScannedFile":
+        return cls(file_path, stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev)
+
+
+@dataclass
+class ScanRootReport:
+    root: str
+    directories: int = 0
+    files: int = 0
+    elapsed: float = 0.0
+
+
+def compute_fingerprint(file_path: str, size: int) -> Optional[str]:
+    # Size plus head, middle and tail samples: cheap enough for a scan and
+    # stable across renames, unlike inode or path.
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(file_path, "rb") as f:
+            if size <= FINGERPRINT_SAMPLE_SIZE * 3:
+                digest.update(f.read())
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    middle = size // 2 - FINGERPRINT_SAMPLE_SIZE // 2
+                    for offset in (0, middle, size - FINGERPRINT_SAMPLE_SIZE):
+                        digest.update(mapped[offset : offset + FINGERPRINT_SAMPLE_SIZE])
+    except (OSError, ValueError) as e:
+        logging.warning(f"Unable to fingerprint {file_path}: {e}")
+        return None
+
+    return f"{size}:{digest.hexdigest()}"
+
+
+def normalize_path(path: str) -> str:
+    if unicodedata.is_normalized("NFKD", path):
+        return path
+    return unicodedata.normalize("NFKD", path)
+
+
+class ParallelDirectoryWalker:
+    def __init__(
+        self,
+        is_valid_file: Callable[[str], bool],
+        is_excluded_dir: Callable[[str], bool],
+        max_workers: int = SCAN_WORKERS,
+    ):
+        self._is_valid_file = is_valid_file
+        self._is_excluded_dir = is_excluded_dir
+        self._max_workers = max(1, max_workers)
+        self.reports: List[ScanRootReport] = []
+
+    def walk(self, roots: List[str]) -> Iterator[ScannedFile]:
+        self.reports = [ScanRootReport(root) for root in roots]
+        outstanding = [0] * len(roots)
+        started_at = time.perf_counter()
+
+        to_scan = []
+        in_flight = {}
+        completed = []
+
+        for index, root in enumerate(roots):
+            if not os.path.isdir(root):
+                logging.warning(f"Scan directory {root} does not exist")
+                continue
+            heapq.heappush(to_scan, ((index,), root))
+            outstanding[index] = 1
+
+        with ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="scan"
+        ) as executor:
+            while to_scan or in_flight:
+                while to_scan and len(in_flight) < self._max_workers * 2:
+                    key, path = heapq.heappop(to_scan)
+                    in_flight[executor.submit(self._scan_directory, path)] = key
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = in_flight.pop(future)
+                    files, subdirs = future.result()
+
+                    for position, subdir in enumerate(subdirs):
+                        heapq.heappush(to_scan, (key + (position,), subdir))
+                    heapq.heappush(completed, (key, files))
+
+                    root_index = key[0]
+                    report = self.reports[root_index]
+                    report.directories += 1
+                    report.files += len(files)
+                    outstanding[root_index] += len(subdirs) - 1
+                    if outstanding[root_index] == 0:
+                        report.elapsed = time.perf_counter() - started_at
+                        logging.info(
+                            f"Scanned {report.root}: {report.files} media files in "
+                            f"{report.directories} directories, {report.elapsed:.2f}s"
+                        )
+
+                # A directory that has not been listed yet always sorts after
+                # its parent, so everything before the smallest pending key
+                # is final and can be released.
+                pending = list(in_flight.values())
+                if to_scan:
+                    pending.append(to_scan[0][0])
+                lowest_pending = min(pending, default=None)
+
+                while completed and (
+                    lowest_pending is None or completed[0][0] < lowest_pending
+                ):
+                    _, files = heapq.heappop(completed)
+                    yield from files
+
+    def _scan_directory(self, path: str) -> Tuple[List[ScannedFile], List[str]]:
+        files = []
+        subdirs = []
+
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if not entry.is_symlink() and not self._is_excluded_dir(
+                                entry.path
+                            ):
+                                subdirs.append(entry.path)
+                            continue
+
+                        if not self._is_valid_file(entry.path):
+                            continue
+
+                        stat = entry.stat()
+                    except OSError as e:
+                        logging.warning(f"Unable to stat {entry.path}: {e}")
+                        continue
+
+                    file_path = normalize_path(entry.path)
+                    files.append(ScannedFile.from_stat(file_path, stat))
+        except OSError as e:
+            logging.warning(f"Unable to list {path}: {e}")
+
+        files.sort()
+        subdirs.sort()
+
+        return files, subdirs
 
 
 class DirectoryScanner:
     def __init__(self, db: Session):
         self._db = db
         self._scan_dirs = self.get_scan_paths()
-        self._excluded_dirs = self.get_excluded_dirs()
+        self._excluded_dirs = tuple(self.get_excluded_dirs())
+        self._media_extensions = frozenset(MEDIA_EXTENSIONS)
+        self._walker = ParallelDirectoryWalker(
+            self.is_valid_media_file, self.is_excluded_dir
+        )
+
+    @property
+    def root_reports(self) -> List[ScanRootReport]:
+        return self._walker.reports
 
     def get_scan_path_settings(self) -> List[entity.Settings]:
         return setting_repository.get_by_key(self._db, SettingKeyEnum.scan_path)
@@ -33,33 +214,97 @@ class DirectoryScanner:
             )
         return excluded_dirs
 
+    def is_excluded_dir(self, dir_path: str) -> bool:
+        return dir_path.startswith(self._excluded_dirs)
+
     def is_valid_media_file(self, file_path: str) -> bool:
         extension = os.path.splitext(file_path)[1]
-        if extension not in MEDIA_EXTENSIONS:
+        if extension not in self._media_extensions:
             return False
-        if any(
-            file_path.startswith(excluded_dir) for excluded_dir in self._excluded_dirs
-        ):
+        if file_path.startswith(self._excluded_dirs):
             return False
         return True
 
     def scan_for_media_files(self) -> List[str]:
-        media_files = []
+        return [media_file.file_path for media_file in self.scan_media_file_stats()]
 
-        for scan_dir in self._scan_dirs:
-            if not os.path.isdir(scan_dir):
-                logging.warning(f"Scan directory {scan_dir} does not exist")
+    def scan_media_file_stats(self) -> List[ScannedFile]:
+        return list(self.iter_media_files())
+
+    def iter_media_files(self) -> Iterator[ScannedFile]:
+        started_at = time.perf_counter()
+        found = 0
+
+        for media_file in self._walker.walk(self._scan_dirs):
+            found += 1
+            yield media_file
+
+        elapsed = time.perf_counter() - started_at
+        metrics.record_scan(elapsed, found)
+        logging.info(f"Found {found} media files in {elapsed:.2f}s")
+
+
+def copy_file_durably(source_path: str, dest_path: str) -> int:
+    partial_path = f"{dest_path}.partial"
+
+    with open(source_path, "rb") as source, open(partial_path, "wb") as dest:
+        try:
+            copied = _copy_stream(source.fileno(), dest.fileno())
+            dest.flush()
+            os.fsync(dest.fileno())
+        except BaseException:
+            dest.close()
+            os.unlink(partial_path)
+            raise
+
+    shutil.copystat(source_path, partial_path)
+    os.replace(partial_path, dest_path)
+    _fsync_dir(os.path.dirname(dest_path))
+
+    return copied
+
+
+def _copy_stream(source_fd: int, dest_fd: int) -> int:
+    size = os.fstat(source_fd).st_size
+    copy_modes = ["copy_file_range", "sendfile", "read"]
+    if not hasattr(os, "copy_file_range"):
+        copy_modes.remove("copy_file_range")
+
+    copied = 0
+    while copied < size:
+        count = min(COPY_CHUNK_SIZE, size - copied)
+        try:
+            if copy_modes[0] == "copy_file_range":
+                written = os.copy_file_range(source_fd, dest_fd, count, copied)
+            elif copy_modes[0] == "sendfile":
+                written = os.sendfile(dest_fd, source_fd, copied, count)
+            else:
+                written = os.write(dest_fd, os.pread(source_fd, count, copied))
+        except OSError as e:
+            # Kernel copies are not available on every filesystem pair;
+            # fall back to the next mode and retry the same chunk.
+            if copy_modes[0] != "read" and e.errno in _UNSUPPORTED_COPY_ERRORS:
+                copy_modes.pop(0)
                 continue
+            raise
+
+        if written == 0:
+            # The source shrank underneath us; callers unlink the source after
+            # a copy, so a short copy must not look like success.
+            raise OSError(
+                errno.EIO, f"Source ended after {copied} of {size} bytes were copied"
+            )
+        copied += written
 
-            for dirpath, _, filenames in os.walk(scan_dir):
-                for filename in filenames:
-                    file_path = os.path.join(dirpath, filename)
-                    if self.is_valid_media_file(file_path):
-                        file_path = unicodedata.normalize("NFKD", file_path)
-                        media_files.append(file_path)
+    return copied
 
-        logging.info(f"Found {len(media_files)} media files")
-        return media_files
+
+def _fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 class FileManager:
@@ -76,19 +321,54 @@ class FileManager:
     def get_temp_path_setting(self) -> entity.Settings:
         return setting_repository.get_setting(self._db, SettingKeyEnum.temp_path)
 
-    def get_encode_temp_path(self, original_path: str) -> str:
+    def get_encode_temp_dir(self) -> str:
         dest_dir = os.path.join(self.get_temp_dir(), "encodes")
         os.makedirs(dest_dir, exist_ok=True)
+        return dest_dir
+
+    def get_encode_temp_path(
+        self, original_path: str, dest_dir: Optional[str] = None
+    ) -> str:
+        dest_dir = dest_dir or self.get_encode_temp_dir()
         return os.path.join(dest_dir, os.path.basename(original_path))
 
     def file_exist(self, path: str) -> bool:
         return os.path.isfile(path)
 
-    def move_file(self, original_path: str, dest_path: str):
+    def get_file_sizes_mb(
+        self, paths: List[str], max_workers: int = SCAN_WORKERS
+    ) -> dict[str, Optional[float]]:
+        # Stats run concurrently since each one can be a round trip on network
+        # mounts; None marks a path that is missing or not a regular file.
+        def file_size_mb(path: str) -> Optional[float]:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            if not S_ISREG(stat.st_mode):
+                return None
+            return float(f"{stat.st_size / 1024 / 1024:.2f}")
+
+        unique = list(dict.fromkeys(paths))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            return dict(zip(unique, executor.map(file_size_mb, unique)))
+
+    def move_file(self, original_path: str, dest_path: str) -> int:
         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        if original_path != dest_path:
+        if original_path == dest_path:
+            return 0
+
+        try:
             os.rename(original_path, dest_path)
-            logging.info(f"Moved {original_path} to {dest_path}")
+            copied = 0
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            copied = copy_file_durably(original_path, dest_path)
+            os.unlink(original_path)
+
+        logging.info(f"Moved {original_path} to {dest_path}")
+        return copied
 
     def get_file_size_mb(self, file_path: str) -> float:
         return (
@@ -97,9 +377,10 @@ class FileManager:
             else None
         )
 
-    def move_original_to_temp(self, original_path: str):
-        temp_path = os.path.join(
+    def get_original_temp_path(self, original_path: str) -> str:
+        return os.path.join(
             self.get_temp_dir(), "originals", os.path.basename(original_path)
         )
-        self.move_file(original_path, temp_path)
-        logging.info(f"Moved {original_path} to {temp_path}")
+
+    def move_original_to_temp(self, original_path: str) -> int:
+        return self.move_file(original_path, self.get_original_temp_path(original_path))
@@ -1,11 +1,30 @@
+import base64
+import datetime
+import json
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
 
 from pydantic import BaseModel
-from sqlalchemy import inspect
+from sqlalchemy import and_, delete, func, inspect, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
 
 from . import schemas
-from encoder.media.entity import Media
+from encoder.config import MEDIA_COUNT_CACHE_SIZE, MEDIA_COUNT_CACHE_TTL
+from encoder.database import chunks
+from encoder.media.entity import IndexedFile, Media, MediaCodec, ScanJobRecord
+from encoder.media.file_system import ScannedFile
+
+CODEC_FIELDS = {
+    schemas.FieldEnum.video_codec: schemas.TrackTypeEnum.video,
+    schemas.FieldEnum.audio_codec: schemas.TrackTypeEnum.audio,
+    schemas.FieldEnum.subtitle_codec: schemas.TrackTypeEnum.subtitle,
+}
 
 
 def get_media(db: Session, media_id: int):
@@ -21,53 +40,208 @@ def get_by_uuid(db: Session, uuid: str):
 
 
 def get_by_ids(db: Session, media_ids: list[int]):
-    return db.query(Media).filter(Media.uuid.in_(media_ids)).all()
+    media_list = []
+    for chunk in chunks(media_ids):
+        media_list.extend(db.query(Media).filter(Media.uuid.in_(chunk)))
+
+    return media_list
 
 
 def get_by_filter(
     db: Session, filter: schemas.PaginationFilter
 ) -> schemas.PaginationResponse:
-    query = db.query(Media)
-
-    if filter.operator == "contains":
-        value_list = [filter.value]
-        if filter.field == "audio_codec":
-            query = query.filter(Media.audio_codec.contains(value_list))
-        elif filter.field == "video_codec":
-            query = query.filter(Media.video_codec.contains(value_list))
-        elif filter.field == "subtitle_codec":
-            query = query.filter(Media.subtitle_codec.contains(value_list))
-
-        elif filter.field == "file_name":
-            query = query.filter(Media.file_name.ilike(f"%{filter.value}%"))
-        elif filter.field == "file_path":
-            query = query.filter(Media.file_path.ilike(f"%{filter.value}%"))
-        elif filter.field == "dimensions":
-            query = query.filter(Media.dimensions.ilike(f"%{filter.value}%"))
+    query = _apply_filter(db.query(Media), filter.field, filter.operator, filter.value)
 
-    total_count = query.count()
+    total_count = _count(query, filter)
 
     order_by = getattr(Media, filter.orderBy.value)
     order_direction = getattr(order_by, filter.orderDirection.value)
+    id_direction = getattr(Media.id, filter.orderDirection.value)
 
-    paginated_query = (
-        query.order_by(order_direction())
-        .offset((filter.page - 1) * filter.pageSize)
-        .limit(filter.pageSize)
-    )
+    paginated_query = query.order_by(order_direction(), id_direction())
+    if filter.after:
+        value, last_id = _decode_cursor(filter)
+        paginated_query = paginated_query.filter(
+            _keyset_condition(order_by, filter.orderDirection, value, last_id)
+        )
+    else:
+        paginated_query = paginated_query.offset((filter.page - 1) * filter.pageSize)
 
-    results = paginated_query.all()
+    results = paginated_query.limit(filter.pageSize).all()
+
+    next_cursor = None
+    if len(results) == filter.pageSize:
+        next_cursor = _encode_cursor(filter, results[-1])
 
     response = schemas.PaginationResponse(
         totalItems=total_count,
         currentPage=filter.page,
         pageSize=filter.pageSize,
+        nextCursor=next_cursor,
         items=results,
     )
 
     return response
 
 
+def _apply_filter(
+    query,
+    field: Optional[schemas.FieldEnum],
+    operator: Optional[schemas.OperatorEnum],
+    value: Optional[str],
+):
+    if operator == "contains":
+        if field in CODEC_FIELDS:
+            query = query.filter(
+                Media.id.in_(
+                    select(MediaCodec.media_id).where(
+                        MediaCodec.track_type == CODEC_FIELDS[field],
+                        MediaCodec.codec == value,
+                    )
+                )
+            )
+        elif field == "file_name":
+            query = query.filter(Media.file_name.ilike(f"%{value}%"))
+        elif field == "file_path":
+            query = query.filter(Media.file_path.ilike(f"%{value}%"))
+        elif field == "dimensions":
+            query = query.filter(Media.dimensions.ilike(f"%{value}%"))
+
+    return query
+
+
+def iter_selection(
+    db: Session,
+    field: Optional[schemas.FieldEnum] = None,
+    operator: Optional[schemas.OperatorEnum] = None,
+    value: Optional[str] = None,
+    batch_size: int = 1000,
+):
+    query = db.query(Media).order_by(Media.id)
+    return _apply_filter(query, field, operator, value).yield_per(batch_size)
+
+
+class _CountCache:
+    # Keys come from user-supplied filters, so entries are capped and the
+    # least recently used go first; expired entries are dropped on write.
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._entries: OrderedDict[tuple, tuple[float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[int]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return None
+            if cached[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return cached[1]
+
+    def set(self, key: tuple, value: int):
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (until, _) in self._entries.items() if until <= now]
+            for k in expired:
+                del self._entries[k]
+
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_count_cache = _CountCache(MEDIA_COUNT_CACHE_TTL, MEDIA_COUNT_CACHE_SIZE)
+
+
+def _count(query, filter: schemas.PaginationFilter) -> Optional[int]:
+    if filter.count == schemas.CountModeEnum.none:
+        return None
+
+    if filter.count == schemas.CountModeEnum.exact:
+        return query.count()
+
+    key = (filter.field, filter.operator, filter.value)
+    cached = _count_cache.get(key)
+    if cached is not None:
+        return cached
+
+    total_count = query.count()
+    _count_cache.set(key, total_count)
+
+    return total_count
+
+
+def _keyset_condition(column, direction: schemas.OrderDirectionEnum, value, last_id):
+    # SQLite sorts NULLs first ascending and last descending.
+    if direction == schemas.OrderDirectionEnum.desc:
+        if value is None:
+            return and_(column.is_(None), Media.id < last_id)
+        return or_(
+            column < value,
+            and_(column == value, Media.id < last_id),
+            column.is_(None),
+        )
+
+    if value is None:
+        return or_(and_(column.is_(None), Media.id > last_id), column.is_not(None))
+    return or_(column > value, and_(column == value, Media.id > last_id))
+
+
+def _encode_cursor(filter: schemas.PaginationFilter, media: Media) -> str:
+    value = getattr(media, filter.orderBy.value)
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+
+    payload = [filter.orderBy.value, filter.orderDirection.value, value, media.id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def _decode_cursor(filter: schemas.PaginationFilter) -> tuple:
+    try:
+        order_by, direction, value, last_id = json.loads(
+            base64.urlsafe_b64decode(filter.after.encode())
+        )
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+
+    if order_by != filter.orderBy.value or direction != filter.orderDirection.value:
+        raise ValueError("Pagination cursor does not match the requested ordering")
+
+    if value is not None and order_by in ("created_at", "updated_at"):
+        value = datetime.datetime.fromisoformat(value)
+
+    return value, last_id
+
+
+def get_existing_file_paths(db: Session, file_paths: list[str]) -> set[str]:
+    existing = set()
+    for chunk in chunks(file_paths):
+        rows = db.query(Media.file_path).filter(Media.file_path.in_(chunk))
+        existing.update(file_path for (file_path,) in rows)
+
+    return existing
+
+
+def delete_unindexed_media(db: Session, seen_since: datetime.datetime) -> int:
+    seen_paths = select(IndexedFile.file_path).where(IndexedFile.seen_at >= seen_since)
+    deleted = (
+        db.query(Media)
+        .filter(Media.file_path.not_in(seen_paths))
+        .delete(synchronize_session=False)
+    )
+    db.execute(
+        delete(MediaCodec).where(MediaCodec.media_id.not_in(select(Media.id)))
+    )
+    db.commit()
+
+    return deleted
+
+
 def get_by_file_path(db: Session, file_path: str):
     return db.query(Media).filter(Media.file_path == file_path).first()
 
@@ -75,6 +249,8 @@ def get_by_file_path(db: Session, file_path: str):
 def create_media(db: Session, data: schemas.MediaCreate) -> Media:
     db_media = Media(**data.model_dump())
     db.add(db_media)
+    db.flush()
+    sync_codecs(db, [db_media])
     db.commit()
     db.refresh(db_media)
 
@@ -82,15 +258,126 @@ def create_media(db: Session, data: schemas.MediaCreate) -> Media:
 
 
 def update_media(db: Session, media: Media, data: schemas.MediaCreate) -> Media:
+    _apply_changes(media, data)
+    sync_codecs(db, [media])
+
+    db.commit()
+    db.refresh(media)
+
+    return media
+
+
+def save_media_batch(db: Session, items: list[schemas.MediaCreate]) -> None:
+    uuids = list({data.uuid for data in items})
+    file_paths = list({data.file_path for data in items})
+
+    by_uuid = {}
+    by_file_path = {}
+    for chunk in chunks(uuids):
+        by_uuid.update(
+            (media.uuid, media)
+            for media in db.query(Media).filter(Media.uuid.in_(chunk))
+        )
+    for chunk in chunks(file_paths):
+        by_file_path.update(
+            (media.file_path, media)
+            for media in db.query(Media).filter(Media.file_path.in_(chunk))
+        )
+
+    changed = {}
+    for data in items:
+        media = by_uuid.get(data.uuid) or by_file_path.get(data.file_path)
+
+        if media:
+            if should_update(data, media):
+                _apply_changes(media, data)
+                changed[id(media)] = media
+        else:
+            logging.info(f"Creating new media: {data.file_path}")
+            media = Media(**data.model_dump())
+            db.add(media)
+            changed[id(media)] = media
+
+        # Later messages in the batch for the same file update this row.
+        by_uuid[data.uuid] = media
+        by_file_path[data.file_path] = media
+
+    db.flush()
+    sync_codecs(db, list(changed.values()))
+    db.commit()
+
+
+def _apply_changes(media: Media, data: schemas.MediaCreate) -> None:
     for key, value in data.model_dump().items():
         if getattr(media, key) != value:
             logging.info(f"Updating {key} from {getattr(media, key)} to {value}")
             setattr(media, key, value)
 
-    db.commit()
-    db.refresh(media)
 
-    return media
+def sync_codecs(db: Session, media_list: list[Media]) -> None:
+    media_ids = [media.id for media in media_list]
+    for chunk in chunks(media_ids):
+        db.execute(delete(MediaCodec).where(MediaCodec.media_id.in_(chunk)))
+
+    rows = [row for media in media_list for row in _codec_rows(media)]
+    if rows:
+        db.execute(insert(MediaCodec), rows)
+
+
+def backfill_codecs(db: Session) -> None:
+    media_ids = [
+        media_id
+        for (media_id,) in db.query(Media.id).filter(
+            Media.id.not_in(select(MediaCodec.media_id))
+        )
+    ]
+
+    for chunk in chunks(media_ids):
+        sync_codecs(db, db.query(Media).filter(Media.id.in_(chunk)).all())
+        db.commit()
+
+
+def get_codec_facets(
+    db: Session, track_type: Optional[schemas.TrackTypeEnum] = None
+) -> list[schemas.CodecFacet]:
+    count = func.count(func.distinct(MediaCodec.media_id))
+    query = db.query(MediaCodec.track_type, MediaCodec.codec, count).group_by(
+        MediaCodec.track_type, MediaCodec.codec
+    )
+    if track_type:
+        query = query.filter(MediaCodec.track_type == track_type)
+
+    return [
+        schemas.CodecFacet(track_type=row[0], codec=row[1], count=row[2])
+        for row in query.order_by(count.desc())
+    ]
+
+
+def _codec_rows(media: Media) -> list[dict]:
+    rows = []
+    for field, track_type in CODEC_FIELDS.items():
+        for track in getattr(media, field.value) or []:
+            if isinstance(track, dict):
+                codec = track.get("codec") or track.get("codec_name")
+                language = track.get("language") or (track.get("tags") or {}).get(
+                    "language"
+                )
+            else:
+                codec, language = track, None
+
+            if not codec:
+                continue
+
+            rows.append(
+                {
+                    "media_id": media.id,
+                    "track_type": track_type.value,
+                    "codec": str(codec),
+                    "language": language,
+                }
+            )
+
+    return rows
 
 
 def should_update(model: BaseModel, database_model):
@@ -113,3 +400,229 @@ def should_update(model: BaseModel, database_model):
     }
 
     return schema_values != model_values
+
+
+class IndexEntry(NamedTuple):
+    stat: ScannedFile
+    fingerprint: Optional[str]
+
+
+def get_file_index(db: Session, file_paths: list[str]) -> dict[str, IndexEntry]:
+    index = {}
+    for chunk in chunks(file_paths):
+        rows = db.query(
+            IndexedFile.file_path,
+            IndexedFile.size,
+            IndexedFile.mtime_ns,
+            IndexedFile.inode,
+            IndexedFile.device,
+            IndexedFile.fingerprint,
+        ).filter(IndexedFile.file_path.in_(chunk))
+        index.update(
+            (row.file_path, IndexEntry(ScannedFile(*row[:5]), row.fingerprint))
+            for row in rows
+        )
+
+    return index
+
+
+def get_indexed_paths_by_fingerprint(
+    db: Session, fingerprints: list[str]
+) -> dict[str, list[str]]:
+    paths = {}
+    for chunk in chunks(fingerprints):
+        rows = db.query(IndexedFile.fingerprint, IndexedFile.file_path).filter(
+            IndexedFile.fingerprint.in_(chunk)
+        )
+        for fingerprint, file_path in rows:
+            paths.setdefault(fingerprint, []).append(file_path)
+
+    return paths
+
+
+def save_file_index(
+    db: Session,
+    files: list[ScannedFile],
+    seen_at: datetime.datetime,
+    fingerprints: Optional[dict[str, str]] = None,
+) -> None:
+    if not files:
+        return
+
+    fingerprints = fingerprints or {}
+    statement = insert(IndexedFile)
+    statement = statement.on_conflict_do_update(
+        index_elements=[IndexedFile.file_path],
+        set_={
+            "size": statement.excluded.size,
+            "mtime_ns": statement.excluded.mtime_ns,
+            "inode": statement.excluded.inode,
+            "device": statement.excluded.device,
+            "seen_at": statement.excluded.seen_at,
+            "fingerprint": statement.excluded.fingerprint,
+            "updated_at": datetime.datetime.utcnow(),
+        },
+    )
+
+    db.execute(
+        statement,
+        [
+            dict(
+                file._asdict(),
+                seen_at=seen_at,
+                fingerprint=fingerprints.get(file.file_path),
+            )
+            for file in files
+        ],
+    )
+    db.commit()
+
+
+def move_media(db: Session, old_path: str, new_path: str) -> bool:
+    moved = (
+        db.query(Media)
+        .filter(Media.file_path == old_path)
+        .update(
+            {Media.file_path: new_path, Media.file_name: os.path.basename(new_path)},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+
+    return moved > 0
+
+
+def delete_stale_indexed_files(db: Session, seen_before: datetime.datetime) -> int:
+    deleted = (
+        db.query(IndexedFile)
+        .filter(IndexedFile.seen_at < seen_before)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+
+    return deleted
+
+
+def create_scan_job(
+    db: Session, job_id: str, full_rescan: bool, started_at: datetime.datetime
+) -> Optional[ScanJobRecord]:
+    record = ScanJobRecord(
+        id=job_id,
+        status=schemas.ScanStatusEnum.running.value,
+        full_rescan=full_rescan,
+        progress=schemas.ScanProgress().model_dump(),
+        timings={},
+        started_at=started_at,
+        heartbeat_at=started_at,
+    )
+    db.add(record)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another scan is already running, possibly in another process.
+        db.rollback()
+        return None
+
+    return record
+
+
+def get_scan_job(db: Session, job_id: str) -> Optional[ScanJobRecord]:
+    return db.get(ScanJobRecord, job_id)
+
+
+def get_running_scan_job(db: Session) -> Optional[ScanJobRecord]:
+    return (
+        db.query(ScanJobRecord)
+        .filter(ScanJobRecord.status == schemas.ScanStatusEnum.running.value)
+        .first()
+    )
+
+
+def save_scan_job_progress(
+    db: Session, job_id: str, progress: dict, timings: dict, now: datetime.datetime
+) -> bool:
+    db.execute(
+        update(ScanJobRecord)
+        .where(ScanJobRecord.id == job_id)
+        .values(progress=progress, timings=timings, heartbeat_at=now)
+    )
+    db.commit()
+
+    cancel_requested = db.scalar(
+        select(ScanJobRecord.cancel_requested).where(ScanJobRecord.id == job_id)
+    )
+    return bool(cancel_requested)
+
+
+def finish_scan_job(
+    db: Session,
+    job_id: str,
+    status: schemas.ScanStatusEnum,
+    progress: dict,
+    timings: dict,
+    error: Optional[str],
+    elapsed: float,
+    finished_at: datetime.datetime,
+) -> None:
+    db.execute(
+        update(ScanJobRecord)
+        .where(ScanJobRecord.id == job_id)
+        .values(
+            status=status.value,
+            progress=progress,
+            timings=timings,
+            error=error,
+            elapsed=elapsed,
+            finished_at=finished_at,
+            heartbeat_at=finished_at,
+        )
+    )
+    db.commit()
+
+
+def request_scan_cancel(db: Session, job_id: str) -> None:
+    db.execute(
+        update(ScanJobRecord)
+        .where(
+            ScanJobRecord.id == job_id,
+            ScanJobRecord.status == schemas.ScanStatusEnum.running.value,
+        )
+        .values(cancel_requested=True)
+    )
+    db.commit()
+
+
+def expire_stale_scan_jobs(db: Session, heartbeat_before: datetime.datetime) -> int:
+    # A process that died mid-scan leaves its row running; without this it
+    # would block every later scan.
+    expired = db.execute(
+        update(ScanJobRecord)
+        .where(
+            ScanJobRecord.status == schemas.ScanStatusEnum.running.value,
+            ScanJobRecord.heartbeat_at < heartbeat_before,
+        )
+        .values(
+            status=schemas.ScanStatusEnum.failed.value,
+            error="Scan stopped reporting progress",
+            finished_at=datetime.datetime.utcnow(),
+        )
+    ).rowcount
+    db.commit()
+
+    return expired
+
+
+def prune_scan_jobs(db: Session, keep: int) -> None:
+    recent = (
+        select(ScanJobRecord.id)
+        .order_by(ScanJobRecord.started_at.desc())
+        .limit(keep)
+        .scalar_subquery()
+    )
+    db.execute(
+        delete(ScanJobRecord).where(
+            ScanJobRecord.id.not_in(recent),
+            ScanJobRecord.status != schemas.ScanStatusEnum.running.value,
+        )
+    )
+    db.commit()
@@ -0,0 +1,210 @@
+import datetime
+import logging
+import threading
+import time
+import uuid
+from typing import Optional
+
+from sqlalchemy.orm import sessionmaker
+
+from encoder.config import SCAN_JOB_STALE_AFTER, SCAN_JOB_SYNC_INTERVAL
+from encoder.database import SessionLocal
+from encoder.media import repository, schemas
+from encoder.media.entity import ScanJobRecord
+from encoder.media.enqueuer import MediaEnqueuer, ScanCancelled
+
+
+class ScanJob:
+    def __init__(self, full_rescan: bool = False):
+        self.id = uuid.uuid4().hex
+        self.full_rescan = full_rescan
+        self.status = schemas.ScanStatusEnum.running
+        self.progress = schemas.ScanProgress()
+        self.timings = {}
+        self.error = None
+        self.started_at = datetime.datetime.utcnow()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.finished = threading.Event()
+        self._started = time.perf_counter()
+        self._elapsed = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.status == schemas.ScanStatusEnum.running
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def finish(self, status: schemas.ScanStatusEnum, error: Optional[str] = None):
+        self._elapsed = time.perf_counter() - self._started
+        self.finished_at = datetime.datetime.utcnow()
+        self.error = error
+        self.status = status
+        self.finished.set()
+
+    def to_view(self) -> schemas.ScanJobView:
+        elapsed = self._elapsed
+        if elapsed is None:
+            elapsed = time.perf_counter() - self._started
+
+        return schemas.ScanJobView(
+            id=self.id,
+            status=self.status,
+            full_rescan=self.full_rescan,
+            progress=self.progress.model_copy(),
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            elapsed=elapsed,
+            files_per_second=self.progress.files_found / elapsed if elapsed else 0.0,
+            timings=dict(self.timings),
+            error=self.error,
+        )
+
+
+def _record_view(record: ScanJobRecord) -> schemas.ScanJobView:
+    elapsed = record.elapsed
+    if elapsed is None:
+        elapsed = (datetime.datetime.utcnow() - record.started_at).total_seconds()
+    progress = schemas.ScanProgress(**(record.progress or {}))
+
+    return schemas.ScanJobView(
+        id=record.id,
+        status=record.status,
+        full_rescan=record.full_rescan,
+        progress=progress,
+        started_at=record.started_at,
+        finished_at=record.finished_at,
+        elapsed=elapsed,
+        files_per_second=progress.files_found / elapsed if elapsed else 0.0,
+        timings=record.timings or {},
+        error=record.error,
+    )
+
+
+class ScanJobManager:
+    # Jobs are rows in scan_jobs, so every API process sees the same jobs and
+    # the single running scan; the process running a scan reports progress
+    # and picks up cancellation through its row.
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        history: int = 20,
+        sync_interval: float = SCAN_JOB_SYNC_INTERVAL,
+        stale_after: float = SCAN_JOB_STALE_AFTER,
+    ):
+        self.session_factory = session_factory
+        self.history = history
+        self.sync_interval = sync_interval
+        self.stale_after = stale_after
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, full_rescan: bool = False) -> schemas.ScanJobView:
+        with self._lock, self.session_factory() as db:
+            repository.expire_stale_scan_jobs(
+                db,
+                datetime.datetime.utcnow()
+                - datetime.timedelta(seconds=self.stale_after),
+            )
+
+            job = ScanJob(full_rescan)
+            while not repository.create_scan_job(
+                db, job.id, full_rescan, job.started_at
+            ):
+                running = repository.get_running_scan_job(db)
+                if running:
+                    return self.get(running.id)
+
+            repository.prune_scan_jobs(db, self.history)
+            self._jobs[job.id] = job
+
+        threading.Thread(
+            target=self._run, args=(job,), name=f"scan-{job.id}", daemon=True
+        ).start()
+
+        return job.to_view()
+
+    def get(self, job_id: str) -> Optional[schemas.ScanJobView]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_view()
+
+        with self.session_factory() as db:
+            record = repository.get_scan_job(db, job_id)
+            return _record_view(record) if record else None
+
+    def cancel(self, job_id: str) -> Optional[schemas.ScanJobView]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        else:
+            # Running in another process, which sees the flag on its next sync.
+            with self.session_factory() as db:
+                repository.request_scan_cancel(db, job_id)
+
+        return self.get(job_id)
+
+    def _run(self, job: ScanJob):
+        logging.info(f"Scan {job.id} started")
+        reporter = threading.Thread(
+            target=self._report, args=(job,), name=f"scan-report-{job.id}", daemon=True
+        )
+        reporter.start()
+
+        with self.session_factory() as db:
+            enqueuer = None
+            try:
+                enqueuer = MediaEnqueuer(db, job.progress, job.cancel_event)
+                enqueuer.process_all_media_files(full_rescan=job.full_rescan)
+                job.finish(schemas.ScanStatusEnum.completed)
+            except ScanCancelled:
+                job.finish(schemas.ScanStatusEnum.cancelled)
+            except Exception as e:
+                logging.exception(e)
+                job.finish(schemas.ScanStatusEnum.failed, str(e))
+            finally:
+                if enqueuer:
+                    job.timings.update(enqueuer.timings)
+
+        reporter.join()
+        view = job.to_view()
+        try:
+            with self.session_factory() as db:
+                repository.finish_scan_job(
+                    db,
+                    job.id,
+                    job.status,
+                    view.progress.model_dump(),
+                    view.timings,
+                    job.error,
+                    view.elapsed,
+                    job.finished_at,
+                )
+        except Exception as e:
+            logging.exception(e)
+        finally:
+            self._jobs.pop(job.id, None)
+
+        logging.info(f"Scan {job.id} {job.status.value}: {view}")
+
+    def _report(self, job: ScanJob):
+        while not job.finished.wait(self.sync_interval):
+            try:
+                with self.session_factory() as db:
+                    cancel_requested = repository.save_scan_job_progress(
+                        db,
+                        job.id,
+                        job.progress.model_dump(),
+                        dict(job.timings),
+                        datetime.datetime.utcnow(),
+                    )
+            except Exception as e:
+                logging.error(f"Unable to save progress of scan {job.id}: {e}")
+                continue
+
+            if cancel_requested:
+                job.cancel()
+
+
+scan_jobs = ScanJobManager()
@@ -84,6 +84,12 @@ class OperatorEnum(str, Enum):
     contains = "contains"
 
 
+class CountModeEnum(str, Enum):
+    exact = "exact"
+    cached = "cached"
+    none = "none"
+
+
 class PaginationFilter(BaseModel):
     page: int = 1
     pageSize: int = 50
@@ -97,6 +103,52 @@ class PaginationFilter(BaseModel):
     field: Optional[FieldEnum] = None
     operator: Optional[OperatorEnum] = None
     value: Optional[str] = None
+    after: Optional[str] = Field(
+        default=None,
+        description="Cursor from nextCursor; takes precedence over page",
+    )
+    count: CountModeEnum = Field(
+        default="exact", description="Options: exact, cached, none"
+    )
+
+
+class TrackTypeEnum(str, Enum):
+    video = "video"
+    audio = "audio"
+    subtitle = "subtitle"
+
+
+class CodecFacet(BaseModel):
+    track_type: TrackTypeEnum
+    codec: str
+    count: int
+
+
+class ScanStatusEnum(str, Enum):
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class ScanProgress(BaseModel):
+    directories: int = 0
+    files_found: int = 0
+    enqueued: int = 0
+    removed: int = 0
+
+
+class ScanJobView(BaseModel):
+    id: str
+    status: ScanStatusEnum
+    full_rescan: bool
+    progress: ScanProgress
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    elapsed: float
+    files_per_second: float
+    timings: dict[str, float] = {}
+    error: Optional[str] = None
 
 
 class ScanCommand(BaseModel):
@@ -106,7 +158,8 @@ class ScanCommand(BaseModel):
 class PaginationResponse(BaseModel):
     currentPage: int
     pageSize: int
-    totalItems: int
+    totalItems: Optional[int] = None
+    nextCursor: Optional[str] = None
     items: Optional[List[Media]] = None
 
     class Config:
@@ -0,0 +1,569 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+
+from encoder.config import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SCAN_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _format_sample(name: str, labelnames: tuple, labels: tuple, value: float) -> str:
+    return f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def merge(self, total, value):
+        return (total or 0.0) + value
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class _Sharded(_Metric):
+    # Every thread writes to its own dict, so the hot path takes no lock;
+    # the lock is only held to register a thread's shard and to read them.
+    # Threads come and go (anyio workers, scan pools), so a dead thread's
+    # shard is folded into _retired and dropped.
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._local = threading.local()
+        self._shards: list[tuple[weakref.ref, dict]] = []
+        self._retired: dict = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            thread = weakref.ref(threading.current_thread())
+            with self._lock:
+                self._prune()
+                self._shards.append((thread, shard))
+            self._local.shard = shard
+        return shard
+
+    def _prune(self):
+        live = []
+        for thread, shard in self._shards:
+            owner = thread()
+            if owner is not None and owner.is_alive():
+                live.append((thread, shard))
+                continue
+            # The owner has exited, so nothing writes to this shard anymore.
+            for labels, value in shard.items():
+                self._retired[labels] = self.merge(self._retired.get(labels), value)
+        self._shards = live
+
+    def _snapshots(self) -> list[dict]:
+        with self._lock:
+            self._prune()
+            shards = [shard for _, shard in self._shards]
+            retired = self._retired.copy()
+        # dict.copy() does not release the GIL, so a shard is never read
+        # half-updated.
+        return [retired] + [shard.copy() for shard in shards]
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def collect(self) -> dict[tuple, float]:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        return totals
+
+    def render(self, samples: Optional[dict] = None) -> list[str]:
+        samples = self.collect() if samples is None else samples
+        return self.header() + [
+            _format_sample(self.name, self.labelnames, labels, value)
+            for labels, value in sorted(samples.items())
+        ]
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Per-bucket counts, then sum and count.
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def collect(self) -> dict[tuple, list]:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, state in shard.items():
+                total = totals.setdefault(labels, [0] * len(state))
+                for index, value in enumerate(list(state)):
+                    total[index] += value
+        return totals
+
+    def merge(self, total, value):
+        if total is None:
+            return list(value)
+        return [left + right for left, right in zip(total, value)]
+
+    def render(self, samples: Optional[dict] = None) -> list[str]:
+        samples = self.collect() if samples is None else samples
+        lines = self.header()
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, state in sorted(samples.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, state[:-2]):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    self.labelnames + ("le",), labels + (bound,)
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{label_text} {state[-1]}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        callback: Optional[Callable[[], dict[tuple, float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def collect(self) -> dict[tuple, float]:
+        return self._callback() if self._callback else self._values.copy()
+
+    def render(
+        self, samples: Optional[dict] = None, labelnames: Optional[tuple] = None
+    ) -> list[str]:
+        samples = self.collect() if samples is None else samples
+        labelnames = self.labelnames if labelnames is None else labelnames
+        return self.header() + [
+            _format_sample(self.name, labelnames, labels, value)
+            for labels, value in sorted(samples.items())
+        ]
+
+
+class WindowedSum:
+    # Sums of the values recorded in the last `window` seconds; written once
+    # per finished encode, so a lock is cheap here.
+    def __init__(self, window: float, fields: int):
+        self.window = window
+        self._entries = deque()
+        self._fields = fields
+        self._lock = threading.Lock()
+
+    def add(self, *values: float):
+        with self._lock:
+            self._entries.append((time.monotonic(), values))
+
+    def totals(self) -> list[float]:
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            while self._entries and self._entries[0][0] < cutoff:
+                self._entries.popleft()
+            entries = list(self._entries)
+
+        totals = [0.0] * self._fields
+        for _, values in entries:
+            for index, value in enumerate(values):
+                totals[index] += value
+        return totals
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        callback: Optional[Callable[[], dict[tuple, float]]] = None,
+    ):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict[str, list]:
+        return {
+            metric.name: [
+                [list(labels), value] for labels, value in metric.collect().items()
+            ]
+            for metric in self._metrics
+        }
+
+    def render_snapshots(self, snapshots: dict[int, dict]) -> str:
+        # Counters and histograms are summed over every process that ever
+        # wrote a snapshot, so totals survive a worker restart; gauges are
+        # per process and get a pid label, and dead processes are dropped.
+        lines = []
+        for metric in self._metrics:
+            samples = {}
+            for pid, snapshot in snapshots.items():
+                for labels, value in snapshot.get(metric.name, []):
+                    labels = tuple(labels)
+                    if isinstance(metric, Gauge):
+                        if _is_alive(pid):
+                            samples[labels + (str(pid),)] = value
+                    else:
+                        samples[labels] = metric.merge(samples.get(labels), value)
+
+            if isinstance(metric, Gauge):
+                lines.extend(metric.render(samples, metric.labelnames + ("pid",)))
+            else:
+                lines.extend(metric.render(samples))
+        return "\n".join(lines) + "\n"
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SnapshotExporter:
+    # API processes behind one port each see a share of the requests, so
+    # every process writes its metrics to a file in a shared directory and
+    # /metrics, wherever it lands, merges all of them.
+    def __init__(
+        self,
+        registry: Registry,
+        directory: str,
+        interval: float = METRICS_FLUSH_INTERVAL,
+    ):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        pid = os.getpid()
+        path = os.path.join(self.directory, f"{pid}.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(temp_path, path)
+
+    def render(self) -> str:
+        self.write()
+
+        snapshots = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                pid = int(os.path.basename(path)[: -len(".json")])
+                with open(path) as f:
+                    snapshots[pid] = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping metrics snapshot {path}: {e}")
+
+        return self.registry.render_snapshots(snapshots)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logging.error(f"Unable to write metrics snapshot: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    # For processes without the API, such as bin/worker.py.
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    logging.info(f"Serving metrics on :{port}/metrics")
+    return server
+
+
+def render() -> str:
+    if exporter is not None:
+        return exporter.render()
+    return registry.render()
+
+
+registry = Registry()
+exporter = SnapshotExporter(registry, METRICS_DIR) if METRICS_DIR else None
+
+consumer_messages = registry.counter(
+    "encoder_consumer_messages_total",
+    "Messages handled by RabbitMQ consumers.",
+    ("queue", "status"),
+)
+consumer_handler_seconds = registry.histogram(
+    "encoder_consumer_handler_seconds",
+    "Time spent in a consumer's message handler.",
+    ("queue",),
+)
+published_messages = registry.counter(
+    "encoder_published_messages_total",
+    "Messages published and confirmed by the broker.",
+    ("queue",),
+)
+publish_failures = registry.counter(
+    "encoder_publish_failures_total",
+    "Publish batches that failed part way.",
+    ("queue",),
+)
+publish_seconds = registry.histogram(
+    "encoder_publish_batch_seconds",
+    "Time to publish and confirm a batch of messages.",
+    ("queue",),
+)
+scan_seconds = registry.histogram(
+    "encoder_scan_duration_seconds",
+    "Time to walk every scan path.",
+    buckets=SCAN_BUCKETS,
+)
+scan_files = registry.counter(
+    "encoder_scan_files_total", "Media files found by completed scans."
+)
+scan_files_per_second = registry.gauge(
+    "encoder_scan_files_per_second", "Walk rate of the last completed scan."
+)
+db_queries = registry.counter(
+    "encoder_db_queries_total",
+    "SQL statements executed, by repository function.",
+    ("function",),
+)
+db_query_seconds = registry.histogram(
+    "encoder_db_query_seconds",
+    "SQL statement execution time, by repository function.",
+    ("function",),
+)
+http_request_seconds = registry.histogram(
+    "encoder_http_request_seconds",
+    "HTTP request latency, by route template.",
+    ("method", "route", "status"),
+)
+http_request_queries = registry.histogram(
+    "encoder_http_request_queries",
+    "SQL statements executed per HTTP request.",
+    ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+encodes_finished = registry.counter(
+    "encoder_encodes_finished_total", "Encodes finalized successfully."
+)
+encode_source_megabytes = registry.counter(
+    "encoder_encode_source_megabytes_total", "Source size of finalized encodes."
+)
+encode_output_megabytes = registry.counter(
+    "encoder_encode_output_megabytes_total", "Output size of finalized encodes."
+)
+_encode_last_hour = WindowedSum(3600.0, fields=2)
+registry.gauge(
+    "encoder_encode_megabytes_last_hour",
+    "Source and output megabytes of encodes finalized in the last hour.",
+    ("direction",),
+    callback=lambda: dict(
+        zip([("source",), ("output",)], _encode_last_hour.totals())
+    ),
+)
+
+
+def record_encode(source_megabytes: Optional[float], output_megabytes: Optional[float]):
+    source_megabytes = source_megabytes or 0.0
+    output_megabytes = output_megabytes or 0.0
+
+    encodes_finished.inc()
+    encode_source_megabytes.inc(amount=source_megabytes)
+    encode_output_megabytes.inc(amount=output_megabytes)
+    _encode_last_hour.add(source_megabytes, output_megabytes)
+
+
+def record_scan(elapsed: float, files: int):
+    scan_seconds.observe(elapsed)
+    scan_files.inc(amount=files)
+    scan_files_per_second.set(files / elapsed if elapsed else 0.0)
+
+
+class RequestStats:
+    # Shared by reference, so queries run in threadpool workers (which get a
+    # copy of the request context) still count toward the request.
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None
+)
+
+
+def calling_repository_function() -> str:
+    # The outermost public function of the innermost run of repository frames,
+    # so helpers (_count) and comprehensions are attributed to their caller.
+    found = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.endswith(".repository"):
+            name = frame.f_code.co_name
+            if found is None or not name.startswith(("_", "<")):
+                found = f"{module.removeprefix('encoder.')}.{name}"
+        elif found is not None:
+            break
+        frame = frame.f_back
+    return found or "other"
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if context is not None:
+            context._metrics_started_at = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        started_at = getattr(context, "_metrics_started_at", None)
+        if started_at is None:
+            return
+
+        elapsed = time.perf_counter() - started_at
+        function = calling_repository_function()
+        db_queries.inc(function)
+        db_query_seconds.observe(elapsed, function)
+
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
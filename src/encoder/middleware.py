@@ -0,0 +1,127 @@
+import datetime
+import logging
+import os
+import re
+import time
+from urllib.parse import parse_qs
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from encoder import metrics
+from encoder.config import PROFILE_DIR, REQUEST_PROFILING, SLOW_REQUEST_THRESHOLD
+from encoder.profiler import SamplingProfiler
+
+log = logging.getLogger(__name__)
+
+UNKNOWN_ERROR = {"detail": [{"msg": "Unknown", "loc": ["Unknown"], "type": "Unknown"}]}
+
+
+class RequestMiddleware:
+    # Pure ASGI, so streaming responses such as /sse pass straight through
+    # instead of being buffered through a task and memory stream.
+    def __init__(
+        self,
+        app: ASGIApp,
+        slow_request_threshold: float = SLOW_REQUEST_THRESHOLD,
+        profiling: bool = REQUEST_PROFILING,
+    ):
+        self.app = app
+        self.slow_request_threshold = slow_request_threshold
+        self.profiling = profiling
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        response = {"status": None, "streaming": False}
+        profiler = self._profiler(scope)
+        started_at = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name == b"content-type" and value.startswith(
+                        b"text/event-stream"
+                    ):
+                        response["streaming"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            if response["status"] is not None:
+                # Headers already went out; nothing sensible left to send.
+                raise
+            error_response = self._error_response(e)
+            response["status"] = error_response.status_code
+            await error_response(scope, receive, send)
+        finally:
+            metrics.current_request.reset(token)
+            elapsed = time.perf_counter() - started_at
+            if profiler is not None:
+                profiler.stop()
+                self._dump_profile(scope, profiler, elapsed)
+            if not response["streaming"]:
+                self._record(scope, response["status"] or 500, stats, elapsed)
+
+    def _error_response(self, e: Exception) -> JSONResponse:
+        log.exception(e)
+        if isinstance(e, ValidationError):
+            return JSONResponse(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                content={"detail": e.errors()},
+            )
+        if isinstance(e, ValueError):
+            return JSONResponse(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=UNKNOWN_ERROR
+            )
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=UNKNOWN_ERROR
+        )
+
+    def _record(self, scope: Scope, status_code: int, stats, elapsed: float):
+        method = scope["method"]
+        # The route template keeps label cardinality bounded.
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+
+        metrics.http_request_seconds.observe(elapsed, method, route, str(status_code))
+        metrics.http_request_queries.observe(stats.queries, method, route)
+
+        if self.slow_request_threshold and elapsed >= self.slow_request_threshold:
+            log.warning(
+                f"Slow request {method} {scope['path']} took {elapsed:.3f}s "
+                f"with {stats.queries} queries in {stats.query_seconds:.3f}s"
+            )
+
+    def _profiler(self, scope: Scope):
+        if not self.profiling:
+            return None
+
+        headers = dict(scope.get("headers", []))
+        query = parse_qs(scope.get("query_string", b"").decode())
+        if headers.get(b"x-profile") != b"1" and query.get("profile") != ["1"]:
+            return None
+
+        profiler = SamplingProfiler()
+        profiler.start()
+        return profiler
+
+    def _dump_profile(self, scope: Scope, profiler: SamplingProfiler, elapsed: float):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+        timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(PROFILE_DIR, f"{timestamp}-{scope['method']}-{name}.txt")
+
+        with open(path, "w") as f:
+            f.write(f"{scope['method']} {scope['path']} in {elapsed:.3f}s\n")
+            f.write(profiler.render())
+            f.write("\n")
+
+        log.info(f"Wrote request profile to {path}")
@@ -0,0 +1,59 @@
+import logging
+import time
+
+from sqlalchemy import inspect
+
+from encoder.database import Base, SessionLocal, engine, init_db
+from encoder.media import repository as media_repository
+
+# Every entity module has to be imported so its table is on Base.metadata.
+from encoder.encode import entity as encode_entity  # noqa: F401
+from encoder.setting import entity as setting_entity  # noqa: F401
+
+
+def migrate():
+    init_db()
+    logging.info("Database schema is up to date")
+
+
+def pending_changes() -> list[str]:
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            missing.append(table.name)
+            continue
+
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing.extend(
+            f"{table.name}.{column.name}"
+            for column in table.columns
+            if column.name not in existing
+        )
+
+    return missing
+
+
+def wait_for_schema(poll_interval: float = 1.0):
+    # For processes that must not migrate themselves, so they never race the
+    # API or `make init_db` on CREATE TABLE / ALTER TABLE.
+    logged = False
+    while missing := pending_changes():
+        if not logged:
+            logging.info(f"Waiting for migrations, missing {', '.join(missing)}")
+            logged = True
+        time.sleep(poll_interval)
+
+    logging.info("Database schema is up to date")
+
+
+def backfill():
+    with SessionLocal() as db:
+        media_repository.backfill_codecs(db)
+
+
+def run():
+    migrate()
+    backfill()
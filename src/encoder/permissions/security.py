@@ -1,9 +1,9 @@
 from typing import Any, List
 
 from fastapi import HTTPException
+from sqlalchemy.orm import Session
 
 from encoder.encode import repository
-from encoder.database import get_db
 
 
 class Voter:
@@ -13,20 +13,28 @@ class Voter:
     def vote(self, attribute: str, subject: Any) -> bool:
         raise NotImplementedError
 
+    def vote_many(self, attribute: str, subjects: List[Any]) -> List[bool]:
+        return [self.vote(attribute, subject) for subject in subjects]
+
 
 class MediaVoter(Voter):
     attribute_encode = "ENCODE"
 
+    def __init__(self, db: Session):
+        self.db = db
+
     def supports(self, attribute: str, subject: Any) -> bool:
         return attribute in MediaVoter.get_supported_attributes()
 
     def vote(self, attribute: str, subject: Any) -> bool:
-        db_generator = get_db()
-        db = next(db_generator)
+        return self.vote_many(attribute, [subject])[0]
 
-        queued_encode = repository.get_encode_by_uuid_and_status(db, subject.uuid)
+    def vote_many(self, attribute: str, subjects: List[Any]) -> List[bool]:
+        queued = repository.get_queued_media_uuids(
+            self.db, [subject.uuid for subject in subjects]
+        )
 
-        return queued_encode is None
+        return [subject.uuid not in queued for subject in subjects]
 
     @staticmethod
     def get_supported_attributes() -> List[str]:
@@ -38,34 +46,66 @@ class DecisionManager:
         self.voters = voters
 
     def decide(self, attribute: str, subject: Any) -> bool:
+        return self.decide_many(attribute, [subject])[0]
+
+    def decide_many(self, attribute: str, subjects: List[Any]) -> List[bool]:
+        decisions = [False] * len(subjects)
+        pending = list(range(len(subjects)))
+
         for voter in self.voters:
-            if not voter.supports(attribute, subject):
-                return False
-            if voter.vote(attribute, subject):
-                return True
-        return False
-
-
-def has_permission(attribute: str, subject: Any = None) -> bool:
-    manager = DecisionManager([MediaVoter()])
-    if not manager.decide(attribute, subject):
-        uuid = subject.uuid if subject else None
-        raise HTTPException(
-            status_code=403,
-            detail={
-                "message": "You do not have permission",
-                "uuid": uuid,
-                "attribute": attribute,
-            },
-        )
+            supported = [i for i in pending if voter.supports(attribute, subjects[i])]
+            if not supported:
+                break
+
+            votes = voter.vote_many(attribute, [subjects[i] for i in supported])
+            pending = []
+            for i, granted in zip(supported, votes):
+                if granted:
+                    decisions[i] = True
+                else:
+                    pending.append(i)
+
+        return decisions
+
+
+def has_permission(db: Session, attribute: str, subject: Any = None) -> bool:
+    return has_permissions(db, attribute, [subject])
+
+
+def decide_permissions(db: Session, attribute: str, subjects: List[Any]) -> List[bool]:
+    return DecisionManager([MediaVoter(db)]).decide_many(attribute, subjects)
+
+
+def has_permissions(db: Session, attribute: str, subjects: List[Any]) -> bool:
+    for subject, granted in zip(subjects, decide_permissions(db, attribute, subjects)):
+        if not granted:
+            uuid = subject.uuid if subject else None
+            raise HTTPException(
+                status_code=403,
+                detail={
+                    "message": "You do not have permission",
+                    "uuid": uuid,
+                    "attribute": attribute,
+                },
+            )
     return True
 
 
-def decorate_media_with_permissions(subject: Any = None):
-    manager = DecisionManager([MediaVoter()])
+def decorate_media_with_permissions(db: Session, subject: Any = None):
+    return decorate_media_list_with_permissions(db, [subject])[0]
+
+
+def decorate_media_list_with_permissions(db: Session, subjects: List[Any]):
+    manager = DecisionManager([MediaVoter(db)])
     attributes = MediaVoter.get_supported_attributes()
 
+    for subject in subjects:
+        # Per-instance dict; Media.permissions is a shared class attribute.
+        subject.permissions = {}
+
     for attribute in attributes:
-        subject.permissions[attribute] = manager.decide(attribute, subject)
+        decisions = manager.decide_many(attribute, subjects)
+        for subject, granted in zip(subjects, decisions):
+            subject.permissions[attribute] = granted
 
-    return subject
+    return subjects
@@ -1,44 +1,52 @@
 import json
+import logging
 import os
-from typing import List
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
+from pydantic import ValidationError
+
+from encoder.config import PRESETS_RELOAD_INTERVAL
 from encoder.preset.schemas import Preset
 
 
 class PresetsCollection:
-    def __init__(self):
-        self.loader = PresetLoader()
+    def __init__(self, registry: Optional["PresetRegistry"] = None):
+        self.registry = registry or preset_registry
 
     def get(self, name: str) -> Preset:
-        preset = self.loader.get(name)
-        return Preset(**preset)
+        return self.registry.get(name)
 
     def all(self) -> List[Preset]:
-        return [Preset(**preset) for preset in self.loader.all()]
+        return self.registry.all()
 
 
 class PresetLoader:
     def __init__(self):
         self.presets_dir = self._get_presets_path()
 
-    def get(self, name: str):
-        all_presets = self._load_all()
-        for preset in all_presets:
-            if preset.get("PresetName", "") == name:
-                return preset
-        raise Exception(f"Preset {name} not found")
-
-    def all(self):
-        all_presets = self._load_all()
-        return all_presets
-
-    def _load_all(self):
-        presets = []
-        for filename in os.listdir(self.presets_dir):
-            with open(os.path.join(self.presets_dir, filename), "r") as f:
-                data = json.load(f)
-            preset_list = data.get("PresetList", [])
-            presets.extend(preset_list)
+    def signature(self) -> Tuple:
+        files = []
+        for filename in sorted(os.listdir(self.presets_dir)):
+            stat = os.stat(os.path.join(self.presets_dir, filename))
+            files.append((filename, stat.st_mtime_ns, stat.st_size))
+
+        return os.stat(self.presets_dir).st_mtime_ns, tuple(files)
+
+    def filenames(self) -> List[str]:
+        return sorted(os.listdir(self.presets_dir))
+
+    def load_file(self, filename: str) -> List[dict]:
+        with open(os.path.join(self.presets_dir, filename), "r") as f:
+            data = json.load(f)
+
+        presets = data.get("PresetList", []) if isinstance(data, dict) else None
+        if not isinstance(presets, list) or not all(
+            isinstance(preset, dict) for preset in presets
+        ):
+            raise ValueError("expected an object with a PresetList array")
+
         return presets
 
     def _get_presets_path(self) -> str:
@@ -46,3 +54,96 @@ class PresetLoader:
         path = os.path.dirname(path)
 
         return os.path.join(path, "data/presets")
+
+
+class PresetRegistry:
+    def __init__(
+        self,
+        loader: Optional[PresetLoader] = None,
+        reload_interval: float = PRESETS_RELOAD_INTERVAL,
+    ):
+        self._loader = loader or PresetLoader()
+        self._reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._presets: Dict[str, Preset] = {}
+        # Last successfully parsed contents of each file, served while a
+        # file is being edited or is broken.
+        self._files: Dict[str, List[dict]] = {}
+        self._signature = None
+        self._checked_at = None
+
+    def get(self, name: str) -> Preset:
+        preset = self._current().get(name)
+        if preset is None:
+            raise Exception(f"Preset {name} not found")
+        return preset
+
+    def all(self) -> List[Preset]:
+        return list(self._current().values())
+
+    def _current(self) -> Dict[str, Preset]:
+        if not self._is_stale():
+            return self._presets
+
+        with self._lock:
+            if self._is_stale():
+                try:
+                    signature = self._loader.signature()
+                    if signature != self._signature:
+                        self._presets = self._build()
+                        self._signature = signature
+                except Exception as e:
+                    # Keeps serving the last good presets; retried after the
+                    # reload interval.
+                    logging.exception(f"Unable to reload presets: {e}")
+                self._checked_at = time.monotonic()
+
+        return self._presets
+
+    def _is_stale(self) -> bool:
+        return (
+            self._checked_at is None
+            or time.monotonic() - self._checked_at >= self._reload_interval
+        )
+
+    def _build(self) -> Dict[str, Preset]:
+        presets = {}
+        sources = {}
+        files = {}
+
+        for filename in self._loader.filenames():
+            try:
+                files[filename] = self._loader.load_file(filename)
+            except (OSError, ValueError) as e:
+                if filename in self._files:
+                    files[filename] = self._files[filename]
+                    logging.error(
+                        f"Unable to load presets from {filename}, keeping the "
+                        f"previous version: {e}"
+                    )
+                else:
+                    logging.error(f"Skipping preset file {filename}: {e}")
+
+        for filename, file_presets in files.items():
+            for data in file_presets:
+                name = data.get("PresetName", "")
+                if name in presets:
+                    logging.error(
+                        f"Duplicate preset {name} in {filename}, "
+                        f"keeping the one from {sources[name]}"
+                    )
+                    continue
+
+                try:
+                    presets[name] = Preset(**data)
+                except ValidationError as e:
+                    logging.error(f"Invalid preset {name} in {filename}: {e}")
+                    continue
+                sources[name] = filename
+
+        self._files = files
+        logging.info(f"Loaded {len(presets)} presets")
+        return presets
+
+
+preset_registry = PresetRegistry()
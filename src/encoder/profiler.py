@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+
+from encoder.config import PROFILE_INTERVAL
+
+MAX_DEPTH = 64
+MIN_SHARE = 0.01
+# Leaf frames of threads that are only waiting for work.
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    # Samples the stacks of every thread, since a request moves between the
+    # event loop and threadpool workers; profile on an otherwise quiet
+    # instance to keep other requests out of the tree.
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._stack(frame)
+                if stack:
+                    self._stacks[stack] += 1
+            self.samples += 1
+
+    def _stack(self, frame) -> Optional[tuple]:
+        if os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+            return None
+
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def render(self) -> str:
+        tree: dict = {}
+        for stack, count in self._stacks.items():
+            node = tree
+            for label in stack:
+                entry = node.setdefault(label, [0, {}])
+                entry[0] += count
+                node = entry[1]
+
+        total = sum(self._stacks.values()) or 1
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f}ms"]
+        self._render_node(tree, total, 0, lines)
+        return "\n".join(lines)
+
+    def _render_node(self, node: dict, total: int, depth: int, lines: list):
+        for label, (count, children) in sorted(
+            node.items(), key=lambda item: item[1][0], reverse=True
+        ):
+            if count / total < MIN_SHARE:
+                continue
+            lines.append(f"{'  ' * depth}{count / total:6.1%} {count:6d}  {label}")
+            self._render_node(children, total, depth + 1, lines)
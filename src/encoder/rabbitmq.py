@@ -1,16 +1,46 @@
+import itertools
 import logging
 import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+from typing import Any, Callable, Iterable, Optional
 
-import pika
+from encoder import metrics
 from encoder.config import (
+    ENCODE_QUEUE_MAX_PRIORITY,
+    RABBITMQ_ENCODE_QUEUE,
     RABBITMQ_HOST,
+    RABBITMQ_MAX_RETRY_DELAY,
     RABBITMQ_USER,
     RABBITMQ_PASS,
+    RABBITMQ_PRODUCER_POOL_SIZE,
+    RABBITMQ_RETRY_DELAY,
 )
 
+# pika is imported where a connection is made, so processes and code paths
+# that never talk to the broker do not pay for it at import time.
+
+# Every declaration of a queue has to use the same arguments, so they live in
+# one place for producers and consumers.
+QUEUE_ARGUMENTS = {}
+if ENCODE_QUEUE_MAX_PRIORITY > 0:
+    QUEUE_ARGUMENTS[RABBITMQ_ENCODE_QUEUE] = {
+        "x-max-priority": min(ENCODE_QUEUE_MAX_PRIORITY, 255)
+    }
+
+
+class PublishError(Exception):
+    def __init__(self, published: int):
+        super().__init__(f"Publishing failed after {published} messages")
+        self.published = published
+
 
 class RabbitMQProducer:
     def __init__(self):
+        import pika
+
         credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
         self.connection = pika.BlockingConnection(
             pika.ConnectionParameters(
@@ -20,38 +50,268 @@ class RabbitMQProducer:
             )
         )
         self.channel = self.connection.channel()
+        self.channel.confirm_delivery()
+        self._declared_queues = set()
 
-    def push_message(self, queue, message: str):
-        self.channel.queue_declare(queue=queue, durable=False)
+    def declare_queue(self, queue: str):
+        if queue in self._declared_queues:
+            return
 
-        self.channel.basic_publish(
-            exchange="",
-            routing_key=queue,
-            body=message,
-            properties=pika.BasicProperties(delivery_mode=2),
+        self.channel.queue_declare(
+            queue=queue, durable=False, arguments=QUEUE_ARGUMENTS.get(queue)
         )
+        self._declared_queues.add(queue)
 
-    def close(self):
-        self.connection.close()
+    def push_message(self, queue, message: str):
+        self.push_messages(queue, [message])
 
+    def push_messages(
+        self,
+        queue: str,
+        messages: Iterable[str],
+        priorities: Optional[Iterable[int]] = None,
+    ) -> int:
+        import pika
+        from pika.exceptions import AMQPError
 
-class RabbitMQConsumer:
-    def __init__(self):
-        self.credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
-        self.thread_local = threading.local()
-
-    def _get_channel(self):
-        if not hasattr(self.thread_local, "connection"):
-            self.thread_local.connection = pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host=RABBITMQ_HOST, credentials=self.credentials
+        self.declare_queue(queue)
+        properties = pika.BasicProperties(delivery_mode=2)
+        messages = list(messages)
+        priorities = list(priorities) if priorities is not None else None
+
+        published = 0
+        for index, message in enumerate(messages):
+            if priorities is not None:
+                properties = pika.BasicProperties(
+                    delivery_mode=2, priority=priorities[index]
                 )
+            # The channel is in confirm mode, so this raises if the broker
+            # nacks or cannot route the message.
+            try:
+                self.channel.basic_publish(
+                    exchange="",
+                    routing_key=queue,
+                    body=message,
+                    properties=properties,
+                    mandatory=True,
+                )
+            except AMQPError as e:
+                raise PublishError(published) from e
+            published += 1
+
+        return published
+
+    def is_open(self) -> bool:
+        from pika.exceptions import AMQPError
+
+        try:
+            # Services heartbeats that piled up while the producer sat idle.
+            self.connection.process_data_events(time_limit=0)
+        except AMQPError:
+            return False
+
+        return self.connection.is_open and self.channel.is_open
+
+    def close(self):
+        if self.connection.is_open:
+            self.connection.close()
+
+
+class RabbitMQProducerPool:
+    def __init__(
+        self,
+        size: int = RABBITMQ_PRODUCER_POOL_SIZE,
+        producer_factory: Callable[[], RabbitMQProducer] = RabbitMQProducer,
+    ):
+        self._producer_factory = producer_factory
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(max(1, size))
+
+    @contextmanager
+    def acquire(self):
+        from pika.exceptions import AMQPError
+
+        with self._slots:
+            producer = self._checkout()
+            try:
+                yield producer
+            except (AMQPError, PublishError):
+                self._discard(producer)
+                raise
+            except Exception:
+                self._idle.put(producer)
+                raise
+            else:
+                self._idle.put(producer)
+
+    def publish(
+        self,
+        queue: str,
+        messages: Iterable[str],
+        priorities: Optional[Iterable[int]] = None,
+    ) -> int:
+        started_at = time.perf_counter()
+        try:
+            with self.acquire() as producer:
+                published = producer.push_messages(queue, messages, priorities)
+        except Exception as e:
+            metrics.published_messages.inc(queue, amount=getattr(e, "published", 0))
+            metrics.publish_failures.inc(queue)
+            raise
+        finally:
+            metrics.publish_seconds.observe(time.perf_counter() - started_at, queue)
+
+        metrics.published_messages.inc(queue, amount=published)
+        return published
+
+    def close(self):
+        while True:
+            try:
+                producer = self._idle.get_nowait()
+            except Empty:
+                return
+            self._discard(producer)
+
+    def use_factory(self, producer_factory: Callable[[], RabbitMQProducer]):
+        # Swaps the broker behind the module-level pool, e.g. for an
+        # in-memory stand-in; idle connections to the old one are closed.
+        self.close()
+        self._producer_factory = producer_factory
+
+    def _checkout(self) -> RabbitMQProducer:
+        while True:
+            try:
+                producer = self._idle.get_nowait()
+            except Empty:
+                return self._producer_factory()
+
+            if producer.is_open():
+                return producer
+            self._discard(producer)
+
+    def _discard(self, producer: RabbitMQProducer):
+        try:
+            producer.close()
+        except Exception:
+            logging.error("Error closing producer connection")
+
+
+producer_pool = RabbitMQProducerPool()
+
+
+class ThreadsafeChannel:
+    # Handed to handlers that run on a worker thread. pika channels may only
+    # be used from the thread that owns the connection, so acks are queued
+    # onto it instead of being sent directly.
+    def __init__(self, connection, channel):
+        self._connection = connection
+        self._channel = channel
+
+    @property
+    def is_open(self) -> bool:
+        return self._channel.is_open
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False):
+        self._call(
+            self._channel.basic_ack, delivery_tag=delivery_tag, multiple=multiple
+        )
+
+    def basic_nack(
+        self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True
+    ):
+        self._call(
+            self._channel.basic_nack,
+            delivery_tag=delivery_tag,
+            multiple=multiple,
+            requeue=requeue,
+        )
+
+    def basic_reject(self, delivery_tag: int = 0, requeue: bool = True):
+        self._call(
+            self._channel.basic_reject, delivery_tag=delivery_tag, requeue=requeue
+        )
+
+    def _call(self, method, **kwargs):
+        def callback():
+            # Delivery tags belong to this channel; once it is gone the broker
+            # redelivers whatever was left unacked.
+            if self._channel.is_open:
+                method(**kwargs)
+            else:
+                logging.warning(f"Channel closed before {method.__name__}")
+
+        try:
+            self._connection.add_callback_threadsafe(callback)
+        except Exception as e:
+            logging.warning(f"Unable to {method.__name__} on a closed connection: {e}")
+
+
+class KeyedExecutor:
+    # One single-threaded executor per worker. Messages with the same key
+    # always land on the same thread, so they run in delivery order, while
+    # different keys run concurrently.
+    def __init__(self, workers: int, thread_name_prefix: str):
+        self._shards = [
+            ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"{thread_name_prefix}-{index}"
             )
-            self.thread_local.channel = self.thread_local.connection.channel()
-            self.thread_local.channel.basic_qos(prefetch_count=1)
-        return self.thread_local.channel
+            for index in range(max(1, workers))
+        ]
+        self._next = itertools.count()
+
+    def submit(self, key: Optional[Any], fn: Callable, *args) -> Future:
+        if key is None:
+            index = next(self._next) % len(self._shards)
+        else:
+            index = hash(key) % len(self._shards)
+
+        return self._shards[index].submit(fn, *args)
+
+    def shutdown(self, wait: bool = True):
+        for shard in self._shards:
+            shard.shutdown(wait=wait, cancel_futures=True)
+
+
+class RabbitMQConsumer:
+    def __init__(
+        self,
+        prefetch_count: int = 1,
+        workers: int = 0,
+        key: Optional[Callable[[Any, bytes], Any]] = None,
+        retry_delay: float = RABBITMQ_RETRY_DELAY,
+        max_retry_delay: float = RABBITMQ_MAX_RETRY_DELAY,
+    ):
+        # With workers, handlers run on a KeyedExecutor instead of the consume
+        # thread and get a ThreadsafeChannel to ack on; key(properties, body)
+        # picks the messages that must be handled in order.
+        self.workers = max(0, workers)
+        self.key = key
+        # Every worker needs a delivery in hand to stay busy.
+        self.prefetch_count = max(prefetch_count, self.workers, 1)
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.consume_thread = None
+        self._executor: Optional[KeyedExecutor] = None
+        self._stopping = threading.Event()
+        self._connection = None
+        self._channel = None
+
+    def _connect(self):
+        import pika
+
+        credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
+        connection = pika.BlockingConnection(
+            pika.ConnectionParameters(host=RABBITMQ_HOST, credentials=credentials)
+        )
+        channel = connection.channel()
+        channel.basic_qos(prefetch_count=self.prefetch_count)
+
+        return connection, channel
 
     def start(self, queue: str, on_message_receive_callback):
+        if self.workers:
+            self._executor = KeyedExecutor(self.workers, queue)
+
         self.consume_thread = threading.Thread(
             target=self._consume,
             args=(queue, on_message_receive_callback),
@@ -62,35 +322,107 @@ class RabbitMQConsumer:
         self.consume_thread.start()
 
     def _consume(self, queue: str, on_message_receive_callback):
-        channel = self._get_channel()
-        channel.queue_declare(queue=queue)
+        on_message = self._instrument(queue, on_message_receive_callback)
+        if self._executor is not None:
+            on_message = self._dispatch(queue, on_message)
+        delay = self.retry_delay
 
-        channel.basic_consume(
-            queue=queue, on_message_callback=on_message_receive_callback
-        )
+        # Connecting happens here rather than in start(), so the API serves
+        # requests while the broker is still unreachable.
+        while not self._stopping.is_set():
+            try:
+                self._connection, self._channel = self._connect()
+                self._channel.queue_declare(
+                    queue=queue, arguments=QUEUE_ARGUMENTS.get(queue)
+                )
+                self._channel.basic_consume(queue=queue, on_message_callback=on_message)
+
+                if self._stopping.is_set():
+                    break
+
+                logging.info(f"Waiting for messages on {queue}")
+                delay = self.retry_delay
+                self._channel.start_consuming()
+            except Exception as e:
+                logging.error(f"Error consuming messages on {queue}: {e}")
+            finally:
+                self._cleanup()
+
+            if self._stopping.wait(delay):
+                break
+            logging.info(f"Reconnecting consumer on {queue} after {delay:.0f}s")
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def _instrument(self, queue: str, on_message_receive_callback):
+        def on_message(channel, method, properties, body):
+            started_at = time.perf_counter()
+            status = "error"
+            try:
+                on_message_receive_callback(channel, method, properties, body)
+                status = "ok"
+            finally:
+                metrics.consumer_messages.inc(queue, status)
+                metrics.consumer_handler_seconds.observe(
+                    time.perf_counter() - started_at, queue
+                )
+
+        return on_message
+
+    def _dispatch(self, queue: str, on_message):
+        def dispatch(channel, method, properties, body):
+            try:
+                key = self.key(properties, body) if self.key else None
+            except Exception as e:
+                logging.warning(f"Unable to read the ordering key on {queue}: {e}")
+                key = None
+
+            worker_channel = ThreadsafeChannel(channel.connection, channel)
+            self._executor.submit(
+                key,
+                self._handle,
+                queue,
+                on_message,
+                worker_channel,
+                method,
+                properties,
+                body,
+            )
 
-        logging.info(f"Waiting for messages on {queue}")
+        return dispatch
+
+    def _handle(self, queue: str, on_message, channel, method, properties, body):
         try:
-            channel.start_consuming()
-        except KeyboardInterrupt:
-            logging.info(f"Stopping consumer on {queue}")
-            channel.stop_consuming()
+            on_message(channel, method, properties, body)
         except Exception as e:
-            logging.error(f"Error consuming messages: {str(e)}")
-        finally:
-            self._cleanup()
+            logging.exception(f"Error handling message on {queue}: {e}")
+            # Unacked it would hold a prefetch slot until the next reconnect,
+            # and requeueing a message that always fails would loop forever.
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
 
     def stop(self):
-        channel = self._get_channel()
-        try:
-            channel.stop_consuming()
-        finally:
-            self._cleanup()
+        self._stopping.set()
+
+        # BlockingConnection is not thread safe; the consume thread stops
+        # itself and closes its own connection.
+        connection, channel = self._connection, self._channel
+        if connection is not None and channel is not None:
+            try:
+                connection.add_callback_threadsafe(channel.stop_consuming)
+            except Exception as e:
+                logging.error(f"Error stopping consumer: {e}")
+
+        if self.consume_thread is not None:
+            self.consume_thread.join(timeout=5)
+
+        # In-flight handlers finish; queued ones are dropped and redelivered,
+        # since their acks can no longer reach the broker.
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
 
     def _cleanup(self):
-        if hasattr(self.thread_local, "connection"):
+        connection, self._connection, self._channel = self._connection, None, None
+        if connection is not None and connection.is_open:
             try:
-                self.thread_local.connection.close()
+                connection.close()
             except Exception:
                 logging.error("Error closing connection")
-            del self.thread_local.connection
@@ -3,6 +3,7 @@ from fastapi import Depends, HTTPException, APIRouter
 from sqlalchemy.orm import Session
 from encoder.setting import repository, schemas
 from encoder.database import get_db
+from encoder.health import health_monitor
 import os
 from typing import Optional
 
@@ -14,6 +15,7 @@ router = APIRouter()
 def create_setting(setting: schemas.SettingsCreate, db: Session = Depends(get_db)):
     setting = repository.create_setting(db=db, setting=setting)
     setting.valid = check_path(setting)
+    health_monitor.invalidate()
 
     return setting
 
@@ -47,6 +49,7 @@ def update_setting(
         raise HTTPException(status_code=404, detail="Setting not found")
     updated_setting = repository.update_setting(db=db, id=id, setting=setting)
     updated_setting.valid = check_path(updated_setting)
+    health_monitor.invalidate()
 
     return updated_setting
 
@@ -61,6 +64,7 @@ def delete_setting(id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail=f"Setting {id} not found")
 
     repository.delete_setting(db=db, id=id)
+    health_monitor.invalidate()
 
 
 def check_path(setting: Optional[schemas.SettingsBase]) -> bool:
@@ -1,5 +1,23 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import suppress
 from queue import Queue
 from threading import Lock
+from typing import Awaitable, Callable, Optional
+
+from encoder.config import (
+    RABBITMQ_ENCODE_PROGRESS_QUEUE,
+    RABBITMQ_HOST,
+    RABBITMQ_MAX_RETRY_DELAY,
+    RABBITMQ_PASS,
+    RABBITMQ_PROGRESS_EXCHANGE,
+    RABBITMQ_RETRY_DELAY,
+    RABBITMQ_USER,
+    SSE_CLIENT_BUFFER_SIZE,
+    SSE_REPLAY_BUFFER_SIZE,
+)
+from encoder.encode.progress import progress_store
 
 
 class SSEQueueSingleton:
@@ -12,3 +30,191 @@ class SSEQueueSingleton:
                 cls._instance = super(SSEQueueSingleton, cls).__new__(cls)
                 cls._instance.queue = Queue()
         return cls._instance
+
+
+class Subscription:
+    def __init__(self, buffer_size: int):
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+    def offer(self, event: dict) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def drop(self):
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class ProgressBroadcastHub:
+    def __init__(
+        self,
+        queue_name: str = RABBITMQ_ENCODE_PROGRESS_QUEUE,
+        exchange_name: Optional[str] = RABBITMQ_PROGRESS_EXCHANGE,
+        buffer_size: int = SSE_CLIENT_BUFFER_SIZE,
+        replay_size: int = SSE_REPLAY_BUFFER_SIZE,
+        retry_delay: float = RABBITMQ_RETRY_DELAY,
+        max_retry_delay: float = RABBITMQ_MAX_RETRY_DELAY,
+        transform: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+    ):
+        self.queue_name = queue_name
+        self.exchange_name = exchange_name
+        self.transform = transform
+        self.buffer_size = buffer_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._subscriptions = set()
+        self._history = deque(maxlen=replay_size)
+        self._last_id = 0
+        self._connection = None
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._consume())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        await self._close_connection()
+
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+            subscription.drop()
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(self.buffer_size)
+
+        for event in self._replay(last_event_id)[-self.buffer_size :]:
+            subscription.offer(event)
+
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, data: str, event: str = "progress"):
+        self._last_id += 1
+        message = {"id": str(self._last_id), "event": event, "data": data}
+        self._history.append(message)
+
+        for subscription in list(self._subscriptions):
+            if not subscription.offer(message):
+                logging.warning("Dropping SSE client that is not keeping up")
+                self.unsubscribe(subscription)
+                subscription.drop()
+
+    def _replay(self, last_event_id: Optional[str]) -> list:
+        if last_event_id is None:
+            return []
+
+        try:
+            last_id = int(last_event_id)
+        except ValueError:
+            return []
+
+        # Ids restart with the process; an id from the future means the
+        # client saw a previous run and has nothing to catch up on here.
+        if last_id > self._last_id:
+            return []
+
+        return [event for event in self._history if int(event["id"]) > last_id]
+
+    async def _consume(self):
+        delay = self.retry_delay
+
+        # Same loop as RabbitMQConsumer: any failure, including the channel or
+        # connection closing under an established consumer, is logged and
+        # retried with backoff instead of silently ending the task.
+        while True:
+            try:
+                closed = await self._subscribe()
+                delay = self.retry_delay
+                reason = await closed
+                logging.error(f"Progress consumer closed: {reason}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error consuming progress messages: {e}")
+            finally:
+                await self._close_connection()
+
+            await asyncio.sleep(delay)
+            logging.info(f"Reconnecting progress consumer after {delay:.0f}s")
+            delay = min(delay * 2, self.max_retry_delay)
+
+    async def _subscribe(self) -> asyncio.Future:
+        import aio_pika
+
+        closed = asyncio.get_running_loop().create_future()
+
+        def on_close(_, exc=None):
+            if not closed.done():
+                closed.set_result(exc)
+
+        self._connection = await aio_pika.connect(
+            f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASS}@{RABBITMQ_HOST}",
+            client_properties={"connection_name": "frontend"},
+        )
+        self._connection.close_callbacks.add(on_close)
+        channel = await self._connection.channel()
+        channel.close_callbacks.add(on_close)
+
+        if self.exchange_name:
+            # Each API process gets its own copy of every update from the
+            # worker's relay, instead of competing for the shared queue.
+            exchange = await channel.declare_exchange(
+                self.exchange_name, aio_pika.ExchangeType.FANOUT, durable=False
+            )
+            queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+            await queue.bind(exchange)
+            source = self.exchange_name
+        else:
+            queue = await channel.declare_queue(self.queue_name, durable=False)
+            source = self.queue_name
+
+        await queue.consume(self._on_message)
+        logging.info(f"Broadcasting messages from {source}")
+        return closed
+
+    async def _close_connection(self):
+        connection, self._connection = self._connection, None
+        if connection is None or connection.is_closed:
+            return
+
+        try:
+            await connection.close()
+        except Exception as e:
+            logging.warning(f"Error closing the progress connection: {e}")
+
+    async def _on_message(self, message):
+        async with message.process():
+            data = message.body.decode()
+            if self.transform is not None:
+                data = await self.transform(data)
+
+            if data is not None:
+                self.publish(data)
+
+
+progress_hub = ProgressBroadcastHub(transform=progress_store.handle_message)
+progress_store.set_publisher(progress_hub.publish)
@@ -0,0 +1,88 @@
+import logging
+import threading
+
+from encoder.config import (
+    ENCODE_RESULTS_PREFETCH,
+    FINALIZE_WORKERS,
+    RABBITMQ_ENCODE_PROGRESS_QUEUE,
+    RABBITMQ_ENCODE_RESULTS_QUEUE,
+    RABBITMQ_PROBE_RESULT_QUEUE,
+    RABBITMQ_PROGRESS_EXCHANGE,
+)
+from encoder.database import SessionLocal
+from encoder.encode.consumer import MediaEncodeQueueConsumer
+from encoder.media.consumer import MediaDataQueueConsumer
+from encoder.rabbitmq import RabbitMQConsumer
+
+
+class ProgressRelay:
+    # Progress updates come in on a single queue, where several API processes
+    # would compete for them; the relay copies each one to a fanout exchange
+    # so every process's SSE hub sees all of them.
+    def __init__(self, exchange: str = RABBITMQ_PROGRESS_EXCHANGE):
+        self.exchange = exchange
+        self._declared_on = None
+
+    def on_message_receive(self, channel, method, properties, body):
+        # Runs on the consume thread, so the consumer's own channel is safe
+        # to publish on; the exchange is declared again after a reconnect.
+        if self._declared_on is not channel:
+            channel.exchange_declare(
+                exchange=self.exchange, exchange_type="fanout", durable=False
+            )
+            self._declared_on = channel
+
+        channel.basic_publish(exchange=self.exchange, routing_key="", body=body)
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+
+class Worker:
+    # Owns the AMQP consumers that write to the database. Exactly one runs per
+    # deployment, either inside the API (RUN_CONSUMERS_IN_API) or as
+    # bin/worker.py, so results are never handled twice against SQLite.
+    def __init__(self):
+        self.consumers: list[RabbitMQConsumer] = []
+
+    def start(self):
+        # Media Encode Consumer
+        media_consumer = MediaEncodeQueueConsumer()
+        encode_connection = RabbitMQConsumer(
+            prefetch_count=ENCODE_RESULTS_PREFETCH,
+            workers=FINALIZE_WORKERS,
+            key=media_consumer.ordering_key,
+        )
+        encode_connection.start(
+            RABBITMQ_ENCODE_RESULTS_QUEUE, media_consumer.on_message_receive
+        )
+        self.consumers.append(encode_connection)
+
+        # Scan Consumer
+        scan_consumer = MediaDataQueueConsumer(SessionLocal)
+        scan_connection = RabbitMQConsumer(prefetch_count=scan_consumer.batch_size)
+        scan_connection.start(
+            RABBITMQ_PROBE_RESULT_QUEUE, scan_consumer.on_message_receive
+        )
+        self.consumers.append(scan_connection)
+
+        if RABBITMQ_PROGRESS_EXCHANGE:
+            relay = ProgressRelay()
+            relay_connection = RabbitMQConsumer(prefetch_count=100)
+            relay_connection.start(
+                RABBITMQ_ENCODE_PROGRESS_QUEUE, relay.on_message_receive
+            )
+            self.consumers.append(relay_connection)
+
+    def stop(self):
+        for consumer in self.consumers:
+            consumer.stop()
+        self.consumers = []
+
+    def run_forever(self, stopping: threading.Event):
+        self.start()
+        logging.info(f"Worker running {len(self.consumers)} consumers")
+        stopping.wait()
+        logging.info("Worker stopping")
+        self.stop()
+
+
+worker = Worker()
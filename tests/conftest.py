@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import uuid
+
+import pytest
+
+# encoder.config reads the environment at import time, so this has to run
+# before anything from encoder is imported.
+WORKDIR = tempfile.mkdtemp(prefix="encoder-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR}/test.sqlite"
+os.environ["RABBITMQ_PROBE_QUEUE"] = "test-probe"
+os.environ["RABBITMQ_ENCODE_QUEUE"] = "test-encode"
+os.environ["MEDIA_EXTENSIONS"] = ".mkv,.mp4,.avi"
+os.environ["EXCLUDE_FOLDERS"] = "@eaDir"
+os.environ["TEMP_FOLDER"] = "encoder"
+os.environ["LOG_LEVEL"] = "ERROR"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    from encoder import migrations
+
+    migrations.migrate()
+    yield
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture
+def db():
+    from encoder.database import Base, SessionLocal, engine
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+
+
+@pytest.fixture
+def broker():
+    from benchmarks.broker import InMemoryBroker
+    from encoder import rabbitmq
+
+    broker = InMemoryBroker()
+    rabbitmq.producer_pool.use_factory(broker.producer)
+    yield broker
+    rabbitmq.producer_pool.use_factory(rabbitmq.RabbitMQProducer)
+
+
+@pytest.fixture
+def make_setting(db):
+    from encoder.setting import repository, schemas
+
+    def make_setting(key: str, value: str):
+        return repository.create_setting(
+            db, schemas.SettingsCreate(key=schemas.SettingKeyEnum(key), value=value)
+        )
+
+    return make_setting
+
+
+@pytest.fixture
+def make_media(db):
+    from encoder.media.entity import Media
+
+    def make_media(**values):
+        file_path = values.pop("file_path", f"/library/{uuid.uuid4()}.mkv")
+        media = Media(
+            uuid=values.pop("uuid", str(uuid.uuid4())),
+            file_path=file_path,
+            file_name=os.path.basename(file_path),
+            **values,
+        )
+        db.add(media)
+        db.commit()
+
+        return media
+
+    return make_media
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+
+    from encoder.database import get_db
+    from encoder.main import api
+
+    # Without the context manager the startup hooks, and with them the broker
+    # connections, never run.
+    api.dependency_overrides[get_db] = lambda: db
+    yield TestClient(api)
+    api.dependency_overrides.clear()
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+from benchmarks.broker import InMemoryProducer
+from encoder import rabbitmq
+from encoder.encode import scheduler
+from encoder.encode.enqueuer import EncodeEnqueuer
+from encoder.encode.entity import Encode
+from encoder.media.file_system import FileManager
+from encoder.preset.presets import preset_registry
+
+ENCODE_QUEUE = "test-encode"
+
+
+@pytest.fixture
+def library(tmp_path, make_setting):
+    make_setting("temp_path", str(tmp_path / "temp"))
+    root = tmp_path / "library"
+    root.mkdir()
+
+    return root
+
+
+@pytest.fixture
+def on_disk(library, make_media):
+    def on_disk(name: str):
+        path = library / name
+        path.write_bytes(b"video" * 1000)
+        return make_media(file_path=str(path))
+
+    return on_disk
+
+
+def enqueue(db, media_list, priority=None):
+    enqueuer = EncodeEnqueuer(db, FileManager(db))
+    return enqueuer.enqueue_for_processing(
+        media_list, preset_registry.get("hevc_fhd"), priority
+    )
+
+
+def statuses(db) -> dict[str, str]:
+    return {encode.media_uuid: encode.status for encode in db.query(Encode)}
+
+
+def test_results_follow_the_request_order(db, broker, on_disk, make_media):
+    first = on_disk("first.mkv")
+    missing = make_media(file_path="/library/gone.mkv")
+    second = on_disk("second.mkv")
+
+    results = enqueue(db, [first, missing, second])
+
+    assert [result.media_uuid for result in results] == [
+        first.uuid,
+        missing.uuid,
+        second.uuid,
+    ]
+    assert [result.status for result in results] == ["queued", "failed", "queued"]
+    assert "does not exist" in results[1].error
+    assert results[1].encode_id is None
+
+    messages = [json.loads(message) for message in broker.drain(ENCODE_QUEUE)]
+    assert sorted(message["id"] for message in messages) == sorted(
+        [results[0].encode_id, results[2].encode_id]
+    )
+    assert statuses(db) == {first.uuid: "queued", second.uuid: "queued"}
+
+
+def test_partial_publish_fails_only_the_unpublished_encodes(db, broker, on_disk):
+    class FailingProducer(InMemoryProducer):
+        def push_messages(self, queue, messages, priorities=None):
+            super().push_messages(queue, list(messages)[:1], priorities)
+            raise rabbitmq.PublishError(published=1)
+
+    rabbitmq.producer_pool.use_factory(lambda: FailingProducer(broker))
+    media_list = [on_disk(f"{name}.mkv") for name in ("a", "b", "c")]
+
+    results = enqueue(db, media_list)
+
+    assert [result.status for result in results].count("queued") == 1
+    failed = [result for result in results if result.status == "failed"]
+    assert len(failed) == 2
+    assert all(result.error.startswith("Publishing failed") for result in failed)
+    assert all(result.encode_id is not None for result in results)
+    assert len(broker.drain(ENCODE_QUEUE)) == 1
+    assert sorted(statuses(db).values()) == ["failed", "failed", "queued"]
+
+
+def test_pinned_priority_is_stored_and_published(db, broker, on_disk, monkeypatch):
+    monkeypatch.setattr(scheduler.encode_scheduler, "max_priority", 10)
+    media = on_disk("pinned.mkv")
+
+    [result] = enqueue(db, [media], priority=7)
+
+    assert db.get(Encode, result.encode_id).priority == 7
+    [message] = broker.drain(ENCODE_QUEUE)
+    assert json.loads(message)["priority"] == 7
+
+
+def test_bulk_endpoint_reports_each_item_in_request_order(
+    db, client, broker, on_disk
+):
+    first = on_disk("first.mkv")
+    already_queued = on_disk("queued.mkv")
+    second = on_disk("second.mkv")
+    db.add(Encode(media_uuid=already_queued.uuid, status="queued"))
+    db.commit()
+
+    media_ids = ["missing", second.uuid, already_queued.uuid, "missing", first.uuid]
+    response = client.post(
+        "/api/encodes/bulk", json={"preset": "hevc_fhd", "media_ids": media_ids}
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["queued"], body["failed"]) == (2, 2)
+    assert [
+        (result["media_uuid"], result["status"], result["error"])
+        for result in body["results"]
+    ] == [
+        ("missing", "failed", "Not found"),
+        (second.uuid, "queued", None),
+        (already_queued.uuid, "failed", "You do not have permission"),
+        (first.uuid, "queued", None),
+    ]
+    assert len(broker.drain(ENCODE_QUEUE)) == 2
+
+
+def test_encode_endpoint_rejects_the_whole_request(db, client, broker, on_disk):
+    allowed = on_disk("allowed.mkv")
+    already_queued = on_disk("queued.mkv")
+    db.add(Encode(media_uuid=already_queued.uuid, status="queued"))
+    db.commit()
+
+    response = client.post(
+        "/api/encodes",
+        json={"preset": "hevc_fhd", "media_ids": [allowed.uuid, already_queued.uuid]},
+    )
+
+    assert response.status_code == 403
+    assert broker.drain(ENCODE_QUEUE) == []
+    assert statuses(db) == {already_queued.uuid: "queued"}
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+from encoder.metrics import Counter, Histogram
+
+
+def run_threads(count: int, target):
+    for _ in range(count):
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+
+def test_shards_of_exited_threads_are_folded_into_the_totals():
+    counter = Counter("test_total", "Test counter", ("queue",))
+    histogram = Histogram("test_seconds", "Test histogram", ("queue",))
+
+    def record():
+        counter.inc("probe")
+        counter.inc("encode", amount=2.0)
+        histogram.observe(0.003, "probe")
+
+    run_threads(500, record)
+    record()
+
+    assert counter.collect() == {("probe",): 501.0, ("encode",): 1002.0}
+    [state] = histogram.collect().values()
+    assert state[-1] == 501
+    assert state[-2] == pytest.approx(501 * 0.003)
+
+    run_threads(500, record)
+
+    assert len(counter._shards) <= 2
+    assert len(histogram._shards) <= 2
+    assert counter.collect() == {("probe",): 1001.0, ("encode",): 2002.0}
+    assert histogram.collect()[("probe",)][-1] == 1001
+
+
+def test_live_threads_keep_their_own_shard():
+    counter = Counter("test_live_total", "Test counter")
+    started = threading.Event()
+    release = threading.Event()
+
+    def record():
+        counter.inc()
+        started.set()
+        release.wait()
+
+    thread = threading.Thread(target=record)
+    thread.start()
+    started.wait()
+
+    assert counter.collect() == {(): 1.0}
+    assert len(counter._shards) == 1
+
+    release.set()
+    thread.join()
+
+    assert counter.collect() == {(): 1.0}
+    assert counter._shards == []
@@ -0,0 +1,101 @@
+import datetime
+
+import pytest
+
+from encoder.media import repository
+from encoder.media.schemas import PaginationFilter
+
+
+def walk(db, **filter_values) -> list[int]:
+    ids = []
+    after = None
+    while True:
+        page = repository.get_by_filter(
+            db, PaginationFilter(pageSize=3, after=after, **filter_values)
+        )
+        ids.extend(media.id for media in page.items)
+        if page.nextCursor is None:
+            return ids
+        after = page.nextCursor
+
+
+def offset_order(db, **filter_values) -> list[int]:
+    page = repository.get_by_filter(db, PaginationFilter(pageSize=100, **filter_values))
+    return [media.id for media in page.items]
+
+
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+def test_cursor_walk_matches_offset_order_with_ties_and_nulls(
+    db, make_media, direction
+):
+    for size in (5.0, None, 1.0, 5.0, 3.0, None, 5.0, 1.0, None, 2.0):
+        make_media(file_size=size)
+
+    ordering = dict(orderBy="file_size", orderDirection=direction)
+    ids = walk(db, **ordering)
+
+    assert ids == offset_order(db, **ordering)
+    assert len(ids) == len(set(ids)) == 10
+
+
+def test_cursor_walk_over_datetimes(db, make_media):
+    created_at = datetime.datetime(2024, 1, 1)
+    for day in (3, 1, 1, 2, 3, 3, 0):
+        make_media(created_at=created_at + datetime.timedelta(days=day))
+
+    ordering = dict(orderBy="created_at", orderDirection="asc")
+
+    assert walk(db, **ordering) == offset_order(db, **ordering)
+
+
+def test_cursor_keeps_position_when_rows_are_added_before_it(db, make_media):
+    for size in (10.0, 20.0, 30.0, 40.0):
+        make_media(file_size=size)
+
+    ordering = dict(orderBy="file_size", orderDirection="asc", pageSize=2)
+    first = repository.get_by_filter(db, PaginationFilter(**ordering))
+    make_media(file_size=1.0)
+    second = repository.get_by_filter(
+        db, PaginationFilter(after=first.nextCursor, **ordering)
+    )
+
+    assert [media.file_size for media in second.items] == [30.0, 40.0]
+
+
+def test_last_page_has_no_cursor(db, make_media):
+    for size in (1.0, 2.0):
+        make_media(file_size=size)
+
+    page = repository.get_by_filter(
+        db, PaginationFilter(orderBy="file_size", orderDirection="desc", pageSize=3)
+    )
+
+    assert page.nextCursor is None
+
+
+def test_cursor_round_trip(make_media):
+    media = make_media(file_size=12.5)
+    filter = PaginationFilter(orderBy="file_size", orderDirection="asc")
+
+    cursor = repository._encode_cursor(filter, media)
+    filter.after = cursor
+
+    assert repository._decode_cursor(filter) == (12.5, media.id)
+
+
+def test_cursor_for_another_ordering_is_rejected(make_media):
+    media = make_media(file_size=12.5)
+    cursor = repository._encode_cursor(
+        PaginationFilter(orderBy="file_size", orderDirection="asc"), media
+    )
+
+    with pytest.raises(ValueError, match="does not match"):
+        repository._decode_cursor(
+            PaginationFilter(orderBy="file_size", orderDirection="desc", after=cursor)
+        )
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "bnVsbA==", "WzFd"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        repository._decode_cursor(PaginationFilter(after=cursor))
@@ -0,0 +1,107 @@
+import os
+import shutil
+
+import pytest
+
+from encoder.media import repository
+from encoder.media.enqueuer import MediaEnqueuer
+from encoder.media.entity import Media
+
+PROBE_QUEUE = "test-probe"
+
+
+@pytest.fixture
+def library(tmp_path, make_setting):
+    root = tmp_path / "library"
+    root.mkdir()
+    make_setting("scan_path", str(root))
+
+    return root
+
+
+def scan(db, broker) -> list[str]:
+    MediaEnqueuer(db).process_all_media_files()
+    return broker.drain(PROBE_QUEUE)
+
+
+def write_media(path, content: bytes = b"video" * 1000):
+    path.write_bytes(content)
+    return str(path)
+
+
+def probed(make_media, path: str) -> Media:
+    # Stands in for the probe result the scan's message would produce.
+    return make_media(file_path=path, file_size=os.path.getsize(path))
+
+
+def media_paths(db) -> list[str]:
+    return sorted(media.file_path for media in db.query(Media))
+
+
+def test_renamed_file_moves_the_media_instead_of_probing_again(
+    db, broker, library, make_media
+):
+    old_path = write_media(library / "old.mkv")
+    assert len(scan(db, broker)) == 1
+    media = probed(make_media, old_path)
+
+    new_path = str(library / "new.mkv")
+    os.rename(old_path, new_path)
+
+    assert scan(db, broker) == []
+    db.refresh(media)
+    assert (media.file_path, media.file_name) == (new_path, "new.mkv")
+    assert media_paths(db) == [new_path]
+    assert set(repository.get_file_index(db, [old_path, new_path])) == {new_path}
+
+
+def test_copy_is_probed_and_leaves_the_original(db, broker, library, make_media):
+    old_path = write_media(library / "old.mkv")
+    scan(db, broker)
+    probed(make_media, old_path)
+
+    copy_path = str(library / "copy.mkv")
+    shutil.copyfile(old_path, copy_path)
+
+    messages = scan(db, broker)
+
+    assert len(messages) == 1 and "copy.mkv" in messages[0]
+    assert media_paths(db) == [old_path]
+
+
+def test_only_one_copy_of_a_renamed_file_claims_its_media(
+    db, broker, library, make_media
+):
+    old_path = write_media(library / "old.mkv")
+    scan(db, broker)
+    probed(make_media, old_path)
+
+    first_path = str(library / "first.mkv")
+    second_path = str(library / "second.mkv")
+    shutil.copyfile(old_path, second_path)
+    os.rename(old_path, first_path)
+
+    messages = scan(db, broker)
+
+    assert len(messages) == 1
+    [moved_to] = media_paths(db)
+    assert moved_to in (first_path, second_path)
+    assert os.path.basename(moved_to) not in messages[0]
+
+
+def test_renamed_and_changed_file_is_probed_as_new_media(
+    db, broker, library, make_media
+):
+    old_path = write_media(library / "old.mkv")
+    scan(db, broker)
+    probed(make_media, old_path)
+
+    os.remove(old_path)
+    new_path = write_media(library / "new.mkv", b"other" * 1000)
+
+    messages = scan(db, broker)
+
+    assert len(messages) == 1 and "new.mkv" in messages[0]
+    # The media for the vanished path is dropped once the scan completes.
+    assert media_paths(db) == []
+    assert set(repository.get_file_index(db, [old_path, new_path])) == {new_path}
@@ -0,0 +1,128 @@
+import math
+import uuid
+
+import pytest
+
+from encoder.encode import scheduler
+from encoder.encode.scheduler import MAX_SCORE, MIN_SCORE, EncodeScheduler
+from encoder.media.entity import Media
+from encoder.preset.presets import preset_registry
+
+
+@pytest.fixture
+def preset():
+    return preset_registry.get("hevc_fhd")
+
+
+def media(**values) -> Media:
+    defaults = dict(
+        uuid=str(uuid.uuid4()),
+        file_path="/library/movie.mkv",
+        file_size=8e9,
+        duration=3600.0,
+        dimensions="1920x1080",
+        video_codec=[{"codec": "h264"}],
+    )
+    return Media(**dict(defaults, **values))
+
+
+def test_priority_spans_the_queue_range():
+    queue = EncodeScheduler(max_priority=10)
+
+    assert queue.priority(MIN_SCORE / 10) == 0
+    assert queue.priority(MIN_SCORE) == 0
+    assert queue.priority(math.sqrt(MIN_SCORE * MAX_SCORE)) == 5
+    assert queue.priority(MAX_SCORE) == 10
+    assert queue.priority(MAX_SCORE * 10) == 10
+
+
+def test_priority_grows_with_the_score():
+    queue = EncodeScheduler(max_priority=255)
+    scores = [10**exponent for exponent in range(2, 9)]
+    priorities = [queue.priority(score) for score in scores]
+
+    assert priorities == sorted(priorities)
+    assert priorities[0] == 0 and priorities[-1] == 255
+
+
+def test_unknown_score_goes_to_the_middle_of_the_range():
+    assert EncodeScheduler(max_priority=10).priority(None) == 5
+
+
+@pytest.mark.parametrize("score", [None, 0.0, MIN_SCORE, MAX_SCORE])
+def test_without_queue_priorities_everything_is_zero(score):
+    assert EncodeScheduler(max_priority=0).priority(score) == 0
+
+
+@pytest.mark.parametrize("configured, expected", [(-1, 0), (10, 10), (1000, 255)])
+def test_max_priority_is_limited_to_what_amqp_supports(configured, expected):
+    assert EncodeScheduler(max_priority=configured).max_priority == expected
+
+
+@pytest.mark.parametrize(
+    "values", [dict(file_size=None), dict(duration=None), dict(dimensions="unknown")]
+)
+def test_score_needs_size_duration_and_dimensions(preset, values):
+    assert EncodeScheduler(max_priority=10).score(media(**values), preset) is None
+
+
+def test_efficient_source_codec_scores_lower(preset):
+    queue = EncodeScheduler(max_priority=10)
+
+    h264 = queue.score(media(), preset)
+    hevc = queue.score(media(video_codec=[{"codec": "hevc"}]), preset)
+
+    assert 0 < hevc < h264
+
+
+def test_schedule_orders_by_priority_then_savings(preset):
+    queue = EncodeScheduler(max_priority=1)
+    unknown = media(dimensions=None)
+    small = media(file_size=2e9)
+    large = media(file_size=8e9)
+
+    scheduled = queue.schedule([unknown, small, large], preset)
+
+    assert scheduled == [(large, 1), (small, 0), (unknown, 0)]
+
+
+def test_pinned_priority_applies_to_every_media_in_savings_order(preset):
+    queue = EncodeScheduler(max_priority=10)
+    unknown = media(dimensions=None)
+    small = media(file_size=2e9)
+    large = media(file_size=8e9)
+
+    scheduled = queue.schedule([unknown, small, large], preset, pinned_priority=3)
+
+    assert scheduled == [(large, 3), (small, 3), (unknown, 3)]
+
+
+@pytest.mark.parametrize("max_priority, pinned", [(10, 11), (0, 1)])
+def test_pin_the_queue_cannot_honour_is_rejected(preset, max_priority, pinned):
+    queue = EncodeScheduler(max_priority=max_priority)
+
+    assert not queue.can_pin(pinned)
+    with pytest.raises(ValueError):
+        queue.schedule([media()], preset, pinned_priority=pinned)
+
+
+@pytest.mark.parametrize("endpoint", ["/api/encodes", "/api/encodes/bulk"])
+@pytest.mark.parametrize(
+    "max_priority, detail",
+    [
+        (4, "Priority must be between 0 and 4"),
+        (0, "Priorities are disabled; set ENCODE_QUEUE_MAX_PRIORITY to pin one"),
+    ],
+)
+def test_api_rejects_pins_above_the_queue_maximum(
+    client, monkeypatch, endpoint, max_priority, detail
+):
+    monkeypatch.setattr(scheduler.encode_scheduler, "max_priority", max_priority)
+
+    response = client.post(
+        endpoint,
+        json={"preset": "hevc_fhd", "media_ids": ["missing"], "priority": 5},
+    )
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == detail